@@ -0,0 +1,179 @@
+"""Пул аккаунтов PlayWallet и выбор аккаунта для заказа.
+
+Аккаунты берутся из PW_ACCOUNTS, а без него — одиночный аккаунт из
+PW_PROD_*/PW_DEV_*. Для каждого аккаунта ведутся последний известный
+баланс, скользящая задержка и доля ошибок; запросы к API ограничиваются
+token bucket'ом, чтобы не упираться в квоты PlayWallet.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from .config import (
+    PW_USE_PROD,
+    PW_DEV_URL,
+    PW_DEV_TOKEN,
+    PW_PROD_URL,
+    PW_PROD_TOKEN,
+    PW_ACCOUNTS,
+    PW_ACCOUNT_RATE_LIMIT,
+)
+from .metrics import PW_ACCOUNT_BALANCE, PW_ACCOUNT_LATENCY, PW_ACCOUNT_ERROR_RATE
+
+logger = logging.getLogger(__name__)
+
+_EWMA_ALPHA = 0.3
+# Окно для доли ошибок (последние N вызовов)
+_ERROR_WINDOW = 50
+
+
+class RateLimiter:
+    """Token bucket: не больше ``rate`` запросов в секунду с запасом ``burst``."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def expected_wait(self) -> float:
+        """Через сколько секунд пройдёт новый запрос с учётом уже ждущих."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, self._waiting + 1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        self._waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+        finally:
+            self._waiting -= 1
+
+
+class PlayWalletAccount:
+    def __init__(self, name: str, url: str, token: str, rate_limit: float, burst: int | None = None):
+        self.name = name
+        self.base_url = url
+        self.headers = {"pw-api-key": token}
+        self.limiter = RateLimiter(rate_limit, burst)
+        self.balance: float | None = None
+        self.latency = 0.0
+        self._results: deque[bool] = deque(maxlen=_ERROR_WINDOW)
+
+    @property
+    def error_rate(self) -> float:
+        if not self._results:
+            return 0.0
+        return self._results.count(False) / len(self._results)
+
+    def observe(self, seconds: float, ok: bool):
+        self.latency = seconds if not self._results else self.latency + _EWMA_ALPHA * (seconds - self.latency)
+        self._results.append(ok)
+        PW_ACCOUNT_LATENCY.labels(account=self.name).set(self.latency)
+        PW_ACCOUNT_ERROR_RATE.labels(account=self.name).set(self.error_rate)
+
+    def set_balance(self, balance: float):
+        self.balance = balance
+        PW_ACCOUNT_BALANCE.labels(account=self.name).set(balance)
+
+    def reserve(self, amount: float):
+        """Уменьшить оценку баланса сразу после создания заказа (до следующего обновления)."""
+        if self.balance is not None:
+            self.set_balance(self.balance - amount)
+
+    def score(self) -> float:
+        """Чем меньше, тем лучше: задержка со штрафом за ошибки плюс
+        ожидание в лимите запросов (иначе все заказы уходят на один
+        аккаунт, пока тот не упрётся в квоту)."""
+        return (self.latency or 0.1) * (1 + 10 * self.error_rate) + self.limiter.expected_wait()
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "balance": self.balance,
+            "latency_ms": round(self.latency * 1000, 1),
+            "error_rate": round(self.error_rate, 3),
+        }
+
+
+class AccountPool:
+    def __init__(self, accounts: list[PlayWalletAccount]):
+        if not accounts:
+            raise ValueError("At least one PlayWallet account is required")
+        self.accounts = accounts
+        self._by_name = {a.name: a for a in accounts}
+
+    @property
+    def primary(self) -> PlayWalletAccount:
+        return self.accounts[0]
+
+    def get(self, name: str | None) -> PlayWalletAccount:
+        """Аккаунт по имени (для оплаты заказа тем же аккаунтом, что его создал)."""
+        if name is None:
+            return self.primary
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise KeyError(f"Unknown PlayWallet account: {name}") from None
+
+    def choose(self, amount: float) -> PlayWalletAccount:
+        """Выбрать аккаунт для заказа на ``amount`` USD.
+
+        Рассматриваются аккаунты, на которых хватает баланса (или он ещё
+        неизвестен); среди них выигрывает наименьший ``score()``, делённый
+        на долю баланса от максимального, — так нагрузка распределяется
+        пропорционально остаткам, а медленные и ошибающиеся аккаунты
+        получают меньше заказов. Если баланса не хватает нигде, берём
+        аккаунт с наибольшим балансом (PlayWallet сам вернёт ошибку).
+        """
+        if len(self.accounts) == 1:
+            return self.primary
+        funded = [a for a in self.accounts if a.balance is None or a.balance >= amount]
+        if not funded:
+            return max(self.accounts, key=lambda a: a.balance or 0.0)
+        top = max((a.balance or 0.0) for a in funded) or 1.0
+
+        def weight(a: PlayWalletAccount) -> float:
+            share = (a.balance if a.balance is not None else top) / top
+            return a.score() / max(share, 0.05)
+
+        return min(funded, key=weight)
+
+
+def _load_accounts() -> list[PlayWalletAccount]:
+    if PW_ACCOUNTS:
+        return [
+            PlayWalletAccount(
+                acc["name"],
+                acc["url"],
+                acc["token"],
+                float(acc.get("rate_limit", PW_ACCOUNT_RATE_LIMIT)),
+                acc.get("burst"),
+            )
+            for acc in PW_ACCOUNTS
+        ]
+    url = ((PW_PROD_URL if PW_USE_PROD else PW_DEV_URL) or "").rstrip("/")
+    token = PW_PROD_TOKEN if PW_USE_PROD else PW_DEV_TOKEN
+    return [PlayWalletAccount("default", url, token, PW_ACCOUNT_RATE_LIMIT)]
+
+
+accounts = AccountPool(_load_accounts())
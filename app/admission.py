@@ -0,0 +1,144 @@
+"""Контроль допуска для операций с заказами (callback Plati, admin topup).
+
+Ограничивает число одновременно выполняемых операций, держит короткую
+очередь ожидания и быстро отвечает 503 + Retry-After, когда ждать
+пришлось бы слишком долго или PlayWallet заметно тормозит — Digiseller
+повторит callback позже вместо таймаута.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, status
+
+from .config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_QUEUE_WAIT,
+    ADMISSION_LATENCY_THRESHOLD,
+    ADMISSION_RETRY_AFTER,
+)
+from .metrics import ADMISSION_DECISIONS, ADMISSION_QUEUE_DEPTH, UPSTREAM_LATENCY_EWMA
+
+# Вес нового наблюдения в экспоненциальном среднем
+_EWMA_ALPHA = 0.3
+# Наблюдения старше этого (сек) не учитываются — задержка считается нормальной
+_LATENCY_STALE_AFTER = 30.0
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, max_queue: int, max_queue_wait: float, latency_threshold: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.latency_threshold = latency_threshold
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        # EWMA длительности операции и задержки PlayWallet (сек)
+        self.service_time = 0.0
+        self.upstream_latency = 0.0
+        self._upstream_observed_at = 0.0
+
+    # ---------- наблюдения ----------
+
+    def observe_upstream(self, seconds: float):
+        if time.monotonic() - self._upstream_observed_at > _LATENCY_STALE_AFTER:
+            self.upstream_latency = seconds
+        else:
+            self.upstream_latency += _EWMA_ALPHA * (seconds - self.upstream_latency)
+        self._upstream_observed_at = time.monotonic()
+        UPSTREAM_LATENCY_EWMA.set(self.upstream_latency)
+
+    def _observe_service(self, seconds: float):
+        self.service_time += _EWMA_ALPHA * (seconds - self.service_time)
+
+    def _upstream_slow(self) -> bool:
+        if time.monotonic() - self._upstream_observed_at > _LATENCY_STALE_AFTER:
+            return False
+        return self.upstream_latency > self.latency_threshold
+
+    def _estimated_wait(self) -> float:
+        return (len(self._waiters) + 1) * self.service_time / self.max_in_flight
+
+    # ---------- допуск ----------
+
+    def _shed(self, reason: str, retry_after: float | None = None) -> HTTPException:
+        ADMISSION_DECISIONS.labels(decision="shed", reason=reason).inc()
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Сервис перегружен ({reason}), повторите позже",
+            headers={"Retry-After": str(max(ADMISSION_RETRY_AFTER, math.ceil(retry_after or 0)))},
+        )
+
+    def _release(self):
+        # слот передаётся первому живому ожидающему, in_flight не меняется
+        while self._waiters:
+            fut = self._waiters.popleft()
+            ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _acquire(self):
+        # Пока PlayWallet тормозит, пропускаем по одной операции как пробу,
+        # иначе задержка никогда не обновится
+        if self._upstream_slow() and self.in_flight > 0:
+            raise self._shed("upstream_latency", self.upstream_latency)
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            ADMISSION_DECISIONS.labels(decision="admitted", reason="").inc()
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            raise self._shed("queue_full", self._estimated_wait())
+        if self._estimated_wait() > self.max_queue_wait:
+            raise self._shed("queue_wait", self._estimated_wait())
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+        ADMISSION_DECISIONS.labels(decision="queued", reason="").inc()
+        try:
+            await asyncio.wait({fut}, timeout=self.max_queue_wait)
+        except asyncio.CancelledError:
+            if fut.done():
+                self._release()
+            else:
+                self._drop_waiter(fut)
+            raise
+        if not fut.done():
+            self._drop_waiter(fut)
+            raise self._shed("queue_timeout", self._estimated_wait())
+
+    def _drop_waiter(self, fut: asyncio.Future):
+        fut.cancel()
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    @asynccontextmanager
+    async def admit(self):
+        """Занять слот на время операции или бросить 503 с Retry-After."""
+        await self._acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._observe_service(time.monotonic() - start)
+            self._release()
+
+
+admission = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_queue_wait=ADMISSION_MAX_QUEUE_WAIT,
+    latency_threshold=ADMISSION_LATENCY_THRESHOLD,
+)
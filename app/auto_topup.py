@@ -1,10 +1,16 @@
 import os, sys, time, hmac, json, httpx, hashlib, asyncio, logging
-from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
-from telegram import Bot
 
 load_dotenv()
 
+if not __package__:
+    # запуск как скрипта: python app/auto_topup.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.logging_config import setup_logging, LOG_DIR
+from app.config import parse_pw_accounts
+from app.bybit_ws import BybitBalanceStream
+from app.profiling import install_profile_signal, monitor_event_loop
+
 # -------- PlayWallet PROD/DEV --------
 PW_USE_PROD   = os.getenv("PW_USE_PROD", "true").lower() == "true"
 PW_DEV_URL    = os.getenv("PW_DEV_URL", "").rstrip("/")
@@ -18,10 +24,35 @@ PW_TOKEN  = PW_PROD_TOKEN if PW_USE_PROD else PW_DEV_TOKEN
 BYBIT_API_KEY    = os.getenv("BYBIT_API_KEY")
 BYBIT_API_SECRET = os.getenv("BYBIT_API_SECRET")
 BYBIT_UID        = os.getenv("BYBIT_UID")
+BYBIT_REST_URL   = os.getenv("BYBIT_REST_URL", "https://api.bybit.com").rstrip("/")
+# Баланс Bybit из приватного WebSocket-потока вместо REST-опроса
+BYBIT_WS_ENABLED = os.getenv("BYBIT_WS_ENABLED", "false").lower() == "true"
+BYBIT_WS_URL     = os.getenv("BYBIT_WS_URL", "wss://stream.bybit.com/v5/private")
 
 MIN_PW_BALANCE = float(os.getenv("MIN_PW_BALANCE", 60))
 TOPUP_AMOUNT   = float(os.getenv("TOPUP_AMOUNT", 120))
 
+# Аккаунты под наблюдением: PW_ACCOUNTS (у каждого свои порог, сумма и UID)
+# или одиночный аккаунт из PW_PROD_*/PW_DEV_*
+ACCOUNTS = [
+    {
+        "name": acc["name"],
+        "url": acc["url"],
+        "token": acc["token"],
+        "min_balance": float(acc.get("min_balance", MIN_PW_BALANCE)),
+        "topup_amount": float(acc.get("topup_amount", TOPUP_AMOUNT)),
+        "bybit_uid": str(acc.get("bybit_uid") or BYBIT_UID),
+    }
+    for acc in parse_pw_accounts(os.getenv("PW_ACCOUNTS"))
+] or [{
+    "name": "default",
+    "url": PW_BASE,
+    "token": PW_TOKEN,
+    "min_balance": MIN_PW_BALANCE,
+    "topup_amount": TOPUP_AMOUNT,
+    "bybit_uid": BYBIT_UID,
+}]
+
 TG_TOKEN   = os.getenv("TG_BOT_TOKEN")
 TG_CHAT_ID = os.getenv("TG_CHAT_ID")
 
@@ -30,54 +61,33 @@ DRY_RUN = os.getenv("TOPUP_DRY_RUN", "false").lower() == "true"
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
 # ---------- logging ----------
-LOG_DIR = os.getenv("LOG_DIR", "/app/logs")
-LOG_PATH = os.path.join(LOG_DIR, "auto_topup.log")
-
+setup_logging("auto_topup", LOG_LEVEL)
 logger = logging.getLogger("auto_topup")
-logger.setLevel(LOG_LEVEL)
 
-handlers: list[logging.Handler] = []
+# Bot создаётся при первом уведомлении: python-telegram-bot тяжёлый, а без
+# TG_BOT_TOKEN он вовсе не нужен
+_bot = None
 
-try:
-    os.makedirs(LOG_DIR, exist_ok=True)
-    file_handler = RotatingFileHandler(
-        LOG_PATH,
-        maxBytes=5_000_000,
-        backupCount=5,
-        encoding="utf-8",
-    )
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s | %(levelname)s | %(message)s", "%Y-%m-%d %H:%M:%S")
-    )
-    handlers.append(file_handler)
-except (OSError, PermissionError) as exc:
-    sys.stderr.write(
-        f"[auto_topup] Unable to open log file '{LOG_PATH}': {exc}. Falling back to stdout only.\n"
-    )
-
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(
-    logging.Formatter("%(asctime)s | %(levelname)s | %(message)s", "%Y-%m-%d %H:%M:%S")
-)
-handlers.append(stream_handler)
 
-if not logger.handlers:
-    for handler in handlers:
-        logger.addHandler(handler)
+def get_bot():
+    global _bot
+    if _bot is None:
+        from telegram import Bot
 
-bot = Bot(token=TG_TOKEN)
+        _bot = Bot(token=TG_TOKEN)
+    return _bot
 
 # ---------- helpers ----------
 
-async def get_pw_balance() -> float:
-    """Получить баланс PlayWallet через API"""
-    url = f"{PW_BASE}/get-balance/"
-    headers = {"pw-api-key": PW_TOKEN}
+async def get_pw_balance(account: dict) -> float:
+    """Получить баланс аккаунта PlayWallet через API"""
+    url = f"{account['url']}/get-balance/"
+    headers = {"pw-api-key": account["token"]}
     async with httpx.AsyncClient(timeout=15) as client:
         r = await client.get(url, headers=headers)
         r.raise_for_status()
         data = r.json()
-        logger.info(f"PW raw response: {data}")  # логируем всё
+        logger.debug(f"PW raw response ({account['name']}): {data}")
         balance_str = (data.get("data") or {}).get("balance", "0")
         try:
             return float(balance_str)
@@ -116,13 +126,13 @@ def sign_bybit(payload: dict | None = None, query: str = "") -> dict:
 
 async def get_bybit_balance() -> float:
     query = "accountType=UNIFIED"
-    url = f"https://api.bybit.com/v5/account/wallet-balance?{query}"
+    url = f"{BYBIT_REST_URL}/v5/account/wallet-balance?{query}"
     headers = sign_bybit(query=query)
     async with httpx.AsyncClient(timeout=15) as client:
         r = await client.get(url, headers=headers)
         r.raise_for_status()
         data = r.json()
-        logger.info(f"Bybit raw response: {data}")
+        logger.debug(f"Bybit raw response: {data}")
         try:
             coins = data["result"]["list"][0]["coin"]
             for coin in coins:
@@ -133,10 +143,10 @@ async def get_bybit_balance() -> float:
             return 0.0
         return 0.0
 
-async def transfer_usdt(amount: float) -> dict:
+async def transfer_usdt(amount: float, uid: str) -> dict:
     """Внутренний перевод USDT по UID (Bybit v5)"""
-    url = "https://api.bybit.com/v5/asset/transfer/inter-transfer"
-    payload = {"transferType": 2, "coin": "USDT", "amount": str(amount), "toUserId": str(BYBIT_UID)}
+    url = f"{BYBIT_REST_URL}/v5/asset/transfer/inter-transfer"
+    payload = {"transferType": 2, "coin": "USDT", "amount": str(amount), "toUserId": str(uid)}
     headers = sign_bybit(payload)
     async with httpx.AsyncClient(timeout=20) as client:
         r = await client.post(url, headers=headers, json=payload)
@@ -148,53 +158,131 @@ async def notify(text: str):
     if not TG_TOKEN or not TG_CHAT_ID:
         return
     try:
-        await bot.send_message(chat_id=TG_CHAT_ID, text=text)
+        await get_bot().send_message(chat_id=TG_CHAT_ID, text=text)
     except Exception as e:
         logger.warning(f"Telegram notify failed: {e}")
 
 
 # ---------- main loop ----------
+
+# Последний перевод по аккаунту: имя -> (time.monotonic(), баланс PW до перевода).
+# Пока PlayWallet не зачислил перевод, повторный не отправляется
+_last_topup: dict[str, tuple[float, float]] = {}
+
+
+def in_cooldown(name: str, pw: float) -> bool:
+    """Перевод уже отправлен и ещё не зачислен (не прошло CHECK_INTERVAL_SEC)."""
+    last = _last_topup.get(name)
+    if last is None:
+        return False
+    sent_at, pw_before = last
+    if pw > pw_before or time.monotonic() - sent_at >= CHECK_INTERVAL_SEC:
+        del _last_topup[name]
+        return False
+    return True
+
+
+async def check_account(account: dict, byb: float, confirm: bool = False) -> float:
+    """Проверить баланс аккаунта и при необходимости пополнить его.
+
+    ``confirm`` — перед переводом перепроверить баланс Bybit через REST
+    (когда ``byb`` взят из WebSocket-потока). Возвращает остаток на Bybit
+    после перевода.
+    """
+    name, uid = account["name"], account["bybit_uid"]
+    min_balance, amount = account["min_balance"], account["topup_amount"]
+    pw = await get_pw_balance(account)
+    logger.info(f"Check balances | account={name} | PW={pw:.2f} USD | Bybit={byb:.2f} USDT")
+
+    if in_cooldown(name, pw):
+        logger.info(f"Topup for {name} already sent, waiting for PW to credit it")
+        return byb
+
+    if pw >= min_balance:
+        logger.info(f"Topup not required for {name}")
+        return byb
+
+    if confirm and byb >= amount:
+        byb = await get_bybit_balance()
+        logger.info(f"Bybit balance confirmed via REST: {byb:.2f} USDT")
+
+    if byb < amount:
+        logger.warning(f"Need {amount} USDT for {name}, but Bybit={byb:.2f}")
+        await notify(
+            f"⚠️ [{name}] Нужен перевод {amount} USDT, но на Bybit только {byb:.2f} USDT.\n"
+            f"PW={pw:.2f}$ < {min_balance}$"
+        )
+        return byb
+
+    if DRY_RUN:
+        logger.info(f"[DRY RUN] Would transfer {amount} USDT → UID {uid} ({name})")
+        await notify(f"🧪 DRY RUN [{name}]: PW={pw:.2f}$ < {min_balance}$, Bybit={byb:.2f} USDT")
+        return byb
+
+    resp = await transfer_usdt(amount, uid)
+    _last_topup[name] = (time.monotonic(), pw)
+    logger.info(f"Transfer OK | account={name} | amount={amount} | resp={resp}")
+    await notify(
+        f"⚡ Автопополнение [{name}]: отправлено {amount} USDT на UID {uid}\n"
+        f"📊 Балансы: PW={pw:.2f}$ | Bybit={byb:.2f} USDT\nОтвет: {resp}"
+    )
+    return byb - amount
+
+
 async def main_loop():
     logger.info(
-        f"AutoTopUp started | MIN_PW_BALANCE={MIN_PW_BALANCE} | "
-        f"TOPUP_AMOUNT={TOPUP_AMOUNT} | interval={CHECK_INTERVAL_SEC}s | dry_run={DRY_RUN}"
+        f"AutoTopUp started | accounts={','.join(a['name'] for a in ACCOUNTS)} | "
+        f"interval={CHECK_INTERVAL_SEC}s | dry_run={DRY_RUN} | bybit_ws={BYBIT_WS_ENABLED}"
     )
     await notify("🔄 Автопополнение запущено")
 
+    # задержка loop и блокирующий код — в лог; профиль — по kill -USR1 <pid>
+    asyncio.create_task(monitor_event_loop())
+    install_profile_signal("auto_topup", LOG_DIR)
+
+    stream = None
+    if BYBIT_WS_ENABLED:
+        stream = BybitBalanceStream(
+            BYBIT_WS_URL, BYBIT_API_KEY, BYBIT_API_SECRET,
+            rest_fallback=get_bybit_balance,
+            max_age=CHECK_INTERVAL_SEC,
+        )
+        asyncio.create_task(stream.run())
+
     while True:
+        if stream is not None:
+            stream.increased.clear()
         try:
-            pw  = await get_pw_balance()
-            byb = await get_bybit_balance()
-            logger.info(f"Check balances | PW={pw:.2f} USD | Bybit={byb:.2f} USDT")
-
-            if pw < MIN_PW_BALANCE:
-                if byb >= TOPUP_AMOUNT:
-                    if DRY_RUN:
-                        logger.info(f"[DRY RUN] Would transfer {TOPUP_AMOUNT} USDT → UID {BYBIT_UID}")
-                        await notify(f"🧪 DRY RUN: PW={pw:.2f}$ < {MIN_PW_BALANCE}$, Bybit={byb:.2f} USDT")
-                    else:
-                        resp = await transfer_usdt(TOPUP_AMOUNT)
-                        logger.info(f"Transfer OK | amount={TOPUP_AMOUNT} | resp={resp}")
-                        await notify(
-                            f"⚡ Автопополнение: отправлено {TOPUP_AMOUNT} USDT на UID {BYBIT_UID}\n"
-                            f"📊 Балансы: PW={pw:.2f}$ | Bybit={byb:.2f} USDT\nОтвет: {resp}"
-                        )
-                else:
-                    logger.warning(f"Need {TOPUP_AMOUNT} USDT, but Bybit={byb:.2f}")
-                    await notify(
-                        f"⚠️ Нужен перевод {TOPUP_AMOUNT} USDT, но на Bybit только {byb:.2f} USDT.\n"
-                        f"PW={pw:.2f}$ < {MIN_PW_BALANCE}$"
-                    )
-            else:
-                logger.info("Topup not required")
-        except httpx.HTTPStatusError as e:
-            logger.exception(f"HTTP error: {e.response.status_code} {e.response.text}")
-            await notify(f"❌ HTTP ошибка автопополнения: {e.response.status_code} {e.response.text}")
+            byb = await (stream.get_balance() if stream else get_bybit_balance())
         except Exception as e:
-            logger.exception(f"Unexpected error: {e}")
+            logger.exception(f"Bybit balance error: {e}")
             await notify(f"❌ Ошибка автопополнения: {e}")
-
-        await asyncio.sleep(CHECK_INTERVAL_SEC)
+            await asyncio.sleep(CHECK_INTERVAL_SEC)
+            continue
+
+        # аккаунты проверяются независимо: сбой одного не мешает остальным
+        for account in ACCOUNTS:
+            try:
+                byb = await check_account(account, byb, confirm=stream is not None)
+            except httpx.HTTPStatusError as e:
+                logger.exception(f"HTTP error ({account['name']}): {e.response.status_code} {e.response.text}")
+                await notify(
+                    f"❌ [{account['name']}] HTTP ошибка автопополнения: "
+                    f"{e.response.status_code} {e.response.text}"
+                )
+            except Exception as e:
+                logger.exception(f"Unexpected error ({account['name']}): {e}")
+                await notify(f"❌ [{account['name']}] Ошибка автопополнения: {e}")
+
+        if stream is None:
+            await asyncio.sleep(CHECK_INTERVAL_SEC)
+            continue
+        # с потоком следующая проверка — сразу после пополнения Bybit
+        # (например, пришёл депозит), но не реже CHECK_INTERVAL_SEC
+        try:
+            await asyncio.wait_for(stream.increased.wait(), CHECK_INTERVAL_SEC)
+        except asyncio.TimeoutError:
+            pass
 
 
 if __name__ == "__main__":
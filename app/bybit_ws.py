@@ -0,0 +1,154 @@
+"""Баланс USDT на Bybit из приватного WebSocket-потока ``wallet``.
+
+Используется в auto_topup при BYBIT_WS_ENABLED=true: вместо REST-запроса
+на каждом цикле баланс приходит push-уведомлениями и хранится в памяти.
+При обрыве соединение восстанавливается с повторной авторизацией и
+подпиской, а пока потока нет (или он молчит дольше ``max_age``), баланс
+берётся через REST (``rest_fallback``).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("auto_topup.bybit_ws")
+
+# Bybit закрывает соединение без ping дольше ~30 с
+_PING_INTERVAL = 20
+_RECONNECT_MIN = 1.0
+_RECONNECT_MAX = 60.0
+
+
+def auth_message(api_key: str, api_secret: str, expires_ms: int | None = None) -> dict:
+    """Сообщение авторизации приватного потока Bybit v5."""
+    expires = expires_ms or int((time.time() + 10) * 1000)
+    sign = hmac.new(api_secret.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256).hexdigest()
+    return {"op": "auth", "args": [api_key, expires, sign]}
+
+
+def parse_wallet_usdt(message: dict, account_type: str = "UNIFIED") -> float | None:
+    """walletBalance USDT из сообщения топика ``wallet`` (None, если его там нет)."""
+    for wallet in message.get("data") or []:
+        if wallet.get("accountType", account_type) != account_type:
+            continue
+        for coin in wallet.get("coin") or []:
+            if coin.get("coin") == "USDT":
+                try:
+                    return float(coin.get("walletBalance", 0))
+                except (TypeError, ValueError):
+                    return None
+    return None
+
+
+class BybitBalanceStream:
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        api_secret: str,
+        rest_fallback: Callable[[], Awaitable[float]],
+        max_age: float = 600.0,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.rest_fallback = rest_fallback
+        # Сколько (сек) доверять балансу без сообщений (включая pong):
+        # wallet шлёт только изменения, поэтому тишина дольше этого срока
+        # считается потерей потока и баланс берётся через REST
+        self.max_age = max_age
+        self.balance: float | None = None
+        self.updated_at = 0.0
+        self.connected = False
+        # Выставляется при росте баланса (будит основной цикл). На списания,
+        # в том числе наши собственные переводы, цикл не реагирует
+        self.increased = asyncio.Event()
+
+    def _set(self, balance: float, source: str):
+        previous, self.balance = self.balance, balance
+        self.updated_at = time.monotonic()
+        if previous != balance:
+            logger.info(f"Bybit balance {previous} → {balance:.2f} USDT ({source})")
+        if previous is None or balance > previous:
+            self.increased.set()
+
+    def is_fresh(self) -> bool:
+        return (
+            self.connected
+            and self.balance is not None
+            and time.monotonic() - self.updated_at < self.max_age
+        )
+
+    async def refresh(self) -> float:
+        """Перечитать баланс через REST."""
+        balance = await self.rest_fallback()
+        self._set(balance, "rest")
+        return balance
+
+    async def get_balance(self) -> float:
+        """Баланс из потока, а если он не подключён или устарел — через REST."""
+        if self.is_fresh():
+            return self.balance
+        return await self.refresh()
+
+    async def run(self):
+        """Держать подписку, переподключаясь с экспоненциальной задержкой."""
+        import websockets  # нужен только в режиме WebSocket
+
+        delay = _RECONNECT_MIN
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=None, open_timeout=15) as ws:
+                    await self._subscribe(ws)
+                    delay = _RECONNECT_MIN
+                    # пока не были подписаны, изменения могли пройти мимо
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        logger.warning(f"Bybit REST balance after subscribe failed: {e!r}")
+                    await self._read(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Bybit WS disconnected: {e!r}, reconnect in {delay:.0f}s")
+            finally:
+                self.connected = False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _RECONNECT_MAX)
+
+    async def _subscribe(self, ws):
+        await ws.send(json.dumps(auth_message(self.api_key, self.api_secret)))
+        reply = json.loads(await asyncio.wait_for(ws.recv(), 10))
+        if not reply.get("success"):
+            raise ConnectionError(f"Bybit WS auth failed: {reply}")
+        await ws.send(json.dumps({"op": "subscribe", "args": ["wallet"]}))
+        reply = json.loads(await asyncio.wait_for(ws.recv(), 10))
+        if not reply.get("success"):
+            raise ConnectionError(f"Bybit WS subscribe failed: {reply}")
+        self.connected = True
+        logger.info(f"Bybit WS subscribed to wallet at {self.url}")
+
+    async def _read(self, ws):
+        pinger = asyncio.create_task(self._ping(ws))
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                if message.get("topic") == "wallet":
+                    balance = parse_wallet_usdt(message)
+                    if balance is not None:
+                        self._set(balance, "ws")
+                elif message.get("op") == "pong" or message.get("ret_msg") == "pong":
+                    # соединение живо: баланс без изменений остаётся актуальным
+                    self.updated_at = time.monotonic()
+        finally:
+            pinger.cancel()
+
+    async def _ping(self, ws):
+        while True:
+            await asyncio.sleep(_PING_INTERVAL)
+            await ws.send(json.dumps({"op": "ping"}))
@@ -0,0 +1,180 @@
+"""Запись входящих callback/admin-запросов в NDJSON для последующего replay.
+
+При CAPTURE_ENABLED=true ``CaptureMiddleware`` пишет в CAPTURE_FILE по
+строке на каждый запрос с путём из CAPTURE_PATHS: время прихода, метод,
+путь, параметры, тело, статус и длительность ответа. Секреты заменяются
+на ``***``, а логины и коды покупок — на стабильные хэши (одинаковое
+значение даёт одинаковый хэш, поэтому повторы в нагрузке сохраняются).
+Запись на диск идёт в отдельном потоке.
+
+Воспроизведение — ``scripts/replay_capture.py``.
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from .config import CAPTURE_ENABLED, CAPTURE_FILE, CAPTURE_PATHS
+
+logger = logging.getLogger(__name__)
+
+# Тело запроса больше этого не записывается
+_MAX_BODY = 64 * 1024
+_SECRET_KEY_RE = re.compile(r"(?i)(secret|token|password|api[_-]?key|sign)")
+# Поле -> префикс псевдонима
+_PSEUDONYMIZED = {
+    "login": "user_",
+    "unique_code": "code_",
+    "uniquecode": "code_",
+    "external_id": "code_",
+}
+
+
+def _pseudonym(prefix: str, value: str) -> str:
+    return prefix + hashlib.sha256(value.encode()).hexdigest()[:16]
+
+
+def sanitize(key: str, value):
+    if not isinstance(value, str):
+        return value
+    if _SECRET_KEY_RE.search(key):
+        return "***"
+    prefix = _PSEUDONYMIZED.get(key.lower())
+    return _pseudonym(prefix, value) if prefix and value else value
+
+
+def _sanitize_body(body: bytes):
+    if not body:
+        return None
+    if len(body) > _MAX_BODY:
+        return {"_truncated": len(body)}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return {"_raw_len": len(body)}
+    if isinstance(data, dict):
+        return {k: sanitize(k, v) for k, v in data.items()}
+    return data
+
+
+class _Writer:
+    """Пишет строки в файл из фонового потока.
+
+    Файл открывается сразу: если это не удалось (например, каталог не
+    доступен на запись вне Docker), запись отключается и ``write()``
+    ничего не делает, а не копит строки в очереди.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+        except OSError as exc:
+            logger.warning("Capture disabled, unable to open %s: %s", path, exc)
+            self._file = None
+            self._thread = None
+            return
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def write(self, line: str):
+        if self.enabled:
+            self._queue.put(line)
+
+    def close(self):
+        if self.enabled:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        try:
+            with self._file as f:
+                while (line := self._queue.get()) is not None:
+                    f.write(line)
+                    # дописываем всё, что уже накопилось, одной пачкой
+                    while True:
+                        try:
+                            line = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if line is None:
+                            return
+                        f.write(line)
+                    f.flush()
+        except OSError as exc:
+            logger.warning("Capture stopped, write to %s failed: %s", self.path, exc)
+
+
+_writer: _Writer | None = None
+
+
+def _get_writer() -> _Writer:
+    global _writer
+    if _writer is None:
+        _writer = _Writer(CAPTURE_FILE)
+    return _writer
+
+
+class CaptureMiddleware:
+    """Записывает запросы к CAPTURE_PATHS (при CAPTURE_ENABLED=true)."""
+
+    def __init__(self, app, enabled: bool = CAPTURE_ENABLED, paths: tuple[str, ...] = CAPTURE_PATHS):
+        self.app = app
+        self.enabled = enabled
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not self.enabled
+            or scope["type"] != "http"
+            or not scope.get("path", "").startswith(self.paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        received_at = time.time()
+        start = time.perf_counter()
+        body = bytearray()
+        status_code = 500
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request" and len(body) <= _MAX_BODY:
+                body.extend(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            query = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+            record = {
+                "ts": round(received_at, 6),
+                "method": scope.get("method", ""),
+                "path": scope.get("path", ""),
+                "query": [[k, sanitize(k, v)] for k, v in query],
+                "body": _sanitize_body(bytes(body)),
+                "status": status_code,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            }
+            _get_writer().write(json.dumps(record, ensure_ascii=False) + "\n")
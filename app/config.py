@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,12 +28,27 @@ except ValueError:
 DB_NAME = _get_env("DB_NAME")
 DB_USER = _get_env("DB_USER")
 DB_PASSWORD = _get_env("DB_PASSWORD")
+try:
+    DB_POOL_MIN_SIZE = int(_get_env("DB_POOL_MIN_SIZE", "10"))
+    DB_POOL_MAX_SIZE = int(_get_env("DB_POOL_MAX_SIZE", "10"))
+except ValueError:
+    DB_POOL_MIN_SIZE = DB_POOL_MAX_SIZE = 10
 
 TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN")
 TG_CHAT_ID = os.getenv("TG_CHAT_ID")
 
 DEFAULT_SERVICE_ID = os.getenv("DEFAULT_SERVICE_ID")
 
+ADMIN_SECRET = os.getenv("ADMIN_SECRET")
+
+DIGISELLER_SELLER_ID = os.getenv("DIGISELLER_SELLER_ID")
+DIGISELLER_API_KEY = os.getenv("DIGISELLER_API_KEY")
+
+# Базовые адреса внешних API (переопределяются для staging с фейковыми upstream'ами)
+DIGISELLER_API_URL = (_get_env("DIGISELLER_API_URL", "https://api.digiseller.com") or "").rstrip("/")
+FX_API_URL = (_get_env("FX_API_URL", "https://api.frankfurter.app") or "").rstrip("/")
+TELEGRAM_API_URL = (_get_env("TELEGRAM_API_URL", "https://api.telegram.org") or "").rstrip("/")
+
 # ---- Новые настройки комиссий ----
 def _to_float(env_name: str, default: float) -> float:
     try:
@@ -44,3 +60,89 @@ def _to_float(env_name: str, default: float) -> float:
 COMMISSION_RATE = _to_float("COMMISSION_RATE", 0.06)
 # Минимальная сумма, которую отправляем в PlayWallet (USD)
 MIN_SEND_USD = _to_float("MIN_SEND_USD", 0.25)
+
+# ---- Статистика (агрегаты заказов) ----
+# Как часто пересчитывать свежие агрегаты и обновлять gauges (сек)
+STATS_REFRESH_INTERVAL = _to_float("STATS_REFRESH_INTERVAL", 60)
+# Сколько последних часов пересчитывать при каждой сверке
+STATS_REFRESH_HOURS = int(_to_float("STATS_REFRESH_HOURS", 2))
+
+# ---- Прогрев при старте ----
+# Время жизни кэша курсов валют (сек)
+FX_CACHE_TTL = _to_float("FX_CACHE_TTL", 600)
+# Валюты, курсы которых запрашиваем при старте
+WARMUP_CURRENCIES = [c.strip().upper() for c in (_get_env("WARMUP_CURRENCIES", "RUB,EUR") or "").split(",") if c.strip()]
+# Таймаут одного шага прогрева (сек)
+WARMUP_STEP_TIMEOUT = _to_float("WARMUP_STEP_TIMEOUT", 10)
+
+# ---- Остановка (graceful drain) ----
+# Сколько ждать завершения операций с заказами после SIGTERM (сек)
+DRAIN_TIMEOUT = _to_float("DRAIN_TIMEOUT", 20)
+# Retry-After для callback'ов, пришедших во время остановки (сек)
+DRAIN_RETRY_AFTER = int(_to_float("DRAIN_RETRY_AFTER", 5))
+
+# ---- Трассировка ----
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+# Запросы дольше порога (мс) или с ответом 5xx сохраняются в /admin/traces
+TRACE_SLOW_MS = _to_float("TRACE_SLOW_MS", 1000)
+# Размер кольцевого буфера трейсов
+TRACE_BUFFER_SIZE = int(_to_float("TRACE_BUFFER_SIZE", 200))
+# OTLP/HTTP коллектор, например http://otel-collector:4318 (пусто — не экспортировать)
+TRACE_OTLP_ENDPOINT = _get_env("TRACE_OTLP_ENDPOINT", "")
+# Период отправки трейсов в коллектор (сек)
+TRACE_EXPORT_INTERVAL = _to_float("TRACE_EXPORT_INTERVAL", 5)
+
+# ---- Контроль допуска (load shedding) ----
+# Максимум одновременно выполняемых операций с заказами
+ADMISSION_MAX_IN_FLIGHT = max(1, int(_to_float("ADMISSION_MAX_IN_FLIGHT", 8)))
+# Максимальная длина очереди ожидания
+ADMISSION_MAX_QUEUE = int(_to_float("ADMISSION_MAX_QUEUE", 16))
+# Сколько операция может ждать слот (сек), дольше — 503
+ADMISSION_MAX_QUEUE_WAIT = _to_float("ADMISSION_MAX_QUEUE_WAIT", 5)
+# Порог задержки PlayWallet (сек), выше которого новые операции отклоняются
+ADMISSION_LATENCY_THRESHOLD = _to_float("ADMISSION_LATENCY_THRESHOLD", 8)
+# Минимальный Retry-After для отклонённых запросов (сек)
+ADMISSION_RETRY_AFTER = int(_to_float("ADMISSION_RETRY_AFTER", 10))
+
+# ---- Несколько аккаунтов PlayWallet ----
+def parse_pw_accounts(raw: str | None) -> list[dict]:
+    """Разобрать PW_ACCOUNTS — JSON-список аккаунтов PlayWallet.
+
+    Пример: [{"name": "main", "url": "https://...", "token": "...",
+    "rate_limit": 5, "min_balance": 60, "topup_amount": 120, "bybit_uid": "123"}].
+    Пустое значение — пустой список (используется одиночный PW_* аккаунт).
+    """
+    if not raw or not raw.strip():
+        return []
+    accounts = json.loads(raw)
+    if not isinstance(accounts, list):
+        raise ValueError("PW_ACCOUNTS must be a JSON list")
+    for i, acc in enumerate(accounts):
+        if not acc.get("url") or not acc.get("token"):
+            raise ValueError(f"PW_ACCOUNTS[{i}] must have url and token")
+        acc.setdefault("name", f"account{i + 1}")
+        acc["url"] = acc["url"].rstrip("/")
+    return accounts
+
+
+PW_ACCOUNTS = parse_pw_accounts(os.getenv("PW_ACCOUNTS"))
+# Лимит запросов к API PlayWallet на аккаунт (запросов/сек), если не задан в PW_ACCOUNTS
+PW_ACCOUNT_RATE_LIMIT = _to_float("PW_ACCOUNT_RATE_LIMIT", 5)
+# Как часто обновлять балансы аккаунтов для маршрутизации (сек)
+PW_BALANCE_REFRESH_INTERVAL = _to_float("PW_BALANCE_REFRESH_INTERVAL", 60)
+
+# ---- Event loop и профилирование ----
+# Период замера задержки event loop (сек)
+LOOP_LAG_INTERVAL = _to_float("LOOP_LAG_INTERVAL", 0.5)
+# Блокировка loop дольше порога (мс) логируется со стеком виновника
+LOOP_SLOW_CALLBACK_MS = _to_float("LOOP_SLOW_CALLBACK_MS", 200)
+# Частота сэмплирования профайлера (выборок/сек) и максимум длительности (сек)
+PROFILE_HZ = int(_to_float("PROFILE_HZ", 100))
+PROFILE_MAX_SECONDS = int(_to_float("PROFILE_MAX_SECONDS", 120))
+
+# ---- Запись входящих запросов (для replay) ----
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+# NDJSON-файл: по строке на запрос
+CAPTURE_FILE = _get_env("CAPTURE_FILE", "/app/logs/capture.ndjson")
+# Префиксы путей, которые записываются
+CAPTURE_PATHS = tuple(p.strip() for p in (_get_env("CAPTURE_PATHS", "/plati/callback,/admin/topup") or "").split(",") if p.strip())
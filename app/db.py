@@ -1,19 +1,49 @@
+import json
 import asyncpg
 from datetime import datetime
-from .config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from .config import (
+    DB_HOST,
+    DB_PORT,
+    DB_NAME,
+    DB_USER,
+    DB_PASSWORD,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+)
+from .tracing import traced
 
 pool: asyncpg.Pool | None = None
 
+SQL_ORDER_EXISTS_BY_EXTERNAL_ID = "SELECT 1 FROM orders WHERE external_id=$1"
+SQL_ORDER_BY_EXTERNAL_ID = "SELECT * FROM orders WHERE external_id = $1"
+SQL_ORDER_BY_ID = "SELECT * FROM orders WHERE id=$1"
+
+# Запросы горячего пути callback'а: выполняются на каждом новом соединении,
+# чтобы план попал в кэш prepared statements asyncpg до первого запроса.
+HOT_STATEMENTS = (
+    SQL_ORDER_EXISTS_BY_EXTERNAL_ID,
+    SQL_ORDER_BY_EXTERNAL_ID,
+    SQL_ORDER_BY_ID,
+)
+
+
+async def _warm_connection(conn):
+    for query in HOT_STATEMENTS:
+        await conn.fetchrow(query, "")
+
 
 async def init_pool():
-    """Инициализация пула соединений"""
+    """Инициализация пула соединений (сразу открывает DB_POOL_MIN_SIZE соединений)"""
     global pool
     pool = await asyncpg.create_pool(
         host=DB_HOST,
         port=DB_PORT,
         database=DB_NAME,
         user=DB_USER,
-        password=DB_PASSWORD
+        password=DB_PASSWORD,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        init=_warm_connection,
     )
 
 
@@ -25,6 +55,7 @@ async def close_pool():
         pool = None
 
 
+@traced("db.acquire")
 async def get_conn():
     """Получить соединение из пула"""
     if pool is None:
@@ -39,6 +70,7 @@ async def release_conn(conn):
     await pool.release(conn)
 
 
+@traced("db.ping")
 async def ping() -> None:
     """Проверить доступность базы данных."""
 
@@ -51,6 +83,7 @@ async def ping() -> None:
             await release_conn(conn)
 
 
+@traced("db.insert_order")
 async def insert_order(conn, **kwargs):
     """Вставить новый заказ в таблицу orders"""
 
@@ -62,39 +95,233 @@ async def insert_order(conn, **kwargs):
         except ValueError:
             created_dt = None
 
+    async with conn.transaction():
+        row = await conn.fetchrow(
+            """
+            INSERT INTO orders (
+                id, external_id, login, service_id,
+                amount, status, created_datetime,
+                currency, received_amount, received_usd, pw_account
+            )
+            VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11)
+            ON CONFLICT (id) DO NOTHING
+            RETURNING created_at, currency, status, amount, received_amount, received_usd
+            """,
+            kwargs["id"],
+            kwargs["external_id"],
+            kwargs["login"],
+            kwargs["service_id"],
+            kwargs["amount"],
+            kwargs["status"],
+            created_dt,
+            kwargs.get("currency") or "USD",
+            kwargs.get("received_amount"),
+            kwargs.get("received_usd"),
+            kwargs.get("pw_account"),
+        )
+        if row:
+            await _bump_rollup(conn, row, 1)
+
+
+@traced("db.update_order_status")
+async def update_order_status(conn, id: str, status: str):
+    """Обновить статус заказа по ID"""
+    async with conn.transaction():
+        row = await conn.fetchrow(
+            """
+            WITH prev AS (
+                SELECT id, status FROM orders WHERE id=$2 FOR UPDATE
+            )
+            UPDATE orders o SET status=$1
+            FROM prev
+            WHERE o.id = prev.id AND prev.status IS DISTINCT FROM $1
+            RETURNING o.created_at, o.currency, prev.status AS prev_status,
+                      o.amount, o.received_amount, o.received_usd
+            """,
+            status, id
+        )
+        if row:
+            await _bump_rollup(conn, row, -1, status=row["prev_status"])
+            await _bump_rollup(conn, row, 1, status=status)
+
+
+# =================== Незавершённые операции (pending_operations) ===================
+
+# Стадии, с которых операцию можно безопасно продолжить автоматически:
+# received — во внешние API ещё ничего не отправлено,
+# created  — заказ создан в PlayWallet, запрос на оплату ещё не отправлен.
+RESUMABLE_STAGES = ("received", "created")
+
+
+@traced("db.save_pending_operation")
+async def save_pending_operation(conn, key: str, kind: str, stage: str, context: dict):
+    """Сохранить незавершённую операцию для продолжения после перезапуска."""
     await conn.execute(
         """
-        INSERT INTO orders (
-            id, external_id, login, service_id,
-            amount, status, created_datetime
-        )
-        VALUES ($1,$2,$3,$4,$5,$6,$7)
-        ON CONFLICT (id) DO NOTHING
+        INSERT INTO pending_operations (key, kind, stage, context)
+        VALUES ($1, $2, $3, $4::jsonb)
+        ON CONFLICT (key) DO UPDATE SET
+            kind = EXCLUDED.kind, stage = EXCLUDED.stage,
+            context = EXCLUDED.context, saved_at = NOW()
         """,
-        kwargs["id"],
-        kwargs["external_id"],
-        kwargs["login"],
-        kwargs["service_id"],
-        kwargs["amount"],
-        kwargs["status"],
-        created_dt
+        key, kind, stage, json.dumps(context, default=str)
     )
 
 
-async def update_order_status(conn, id: str, status: str):
-    """Обновить статус заказа по ID"""
+def _pending_row(row) -> dict:
+    item = dict(row)
+    item["context"] = json.loads(item["context"])
+    return item
+
+
+async def claim_pending_operations(conn) -> list[dict]:
+    """Забрать (удалить из таблицы) операции, которые можно продолжить.
+
+    Удаление с RETURNING гарантирует, что при нескольких инстансах
+    операцию продолжит только один из них.
+    """
+    rows = await conn.fetch(
+        "DELETE FROM pending_operations WHERE stage = ANY($1::text[]) RETURNING *",
+        list(RESUMABLE_STAGES)
+    )
+    return [_pending_row(r) for r in rows]
+
+
+async def flag_pending_for_review(conn) -> list[dict]:
+    """Пометить операции с неизвестным исходом (creating/paying) для ручной проверки.
+
+    Возвращает операции со стадией, на которой они были прерваны.
+    """
+    rows = await conn.fetch(
+        """
+        UPDATE pending_operations p SET stage = 'review'
+        FROM (
+            SELECT key, stage FROM pending_operations
+            WHERE stage <> 'review' AND NOT (stage = ANY($1::text[]))
+            FOR UPDATE
+        ) prev
+        WHERE p.key = prev.key
+        RETURNING p.key, p.kind, prev.stage, p.context, p.saved_at
+        """,
+        list(RESUMABLE_STAGES)
+    )
+    return [_pending_row(r) for r in rows]
+
+
+# =================== Агрегаты (orders_rollup_hourly) ===================
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+
+async def _bump_rollup(conn, row, sign: int, status: str | None = None):
+    """Добавить (sign=1) или вычесть (sign=-1) заказ из почасового агрегата."""
+    received_usd = row["received_usd"]
+    amount = row["amount"] or 0
+    commission = (received_usd - amount) if received_usd is not None else 0
     await conn.execute(
-        "UPDATE orders SET status=$1 WHERE id=$2",
-        status, id
+        """
+        INSERT INTO orders_rollup_hourly AS r (
+            bucket, currency, status, orders_count,
+            received_amount, received_usd, sent_usd, commission_usd
+        )
+        VALUES (date_trunc('hour', $1::timestamp), $2, $3, $4, $5, $6, $7, $8)
+        ON CONFLICT (bucket, currency, status) DO UPDATE SET
+            orders_count = r.orders_count + EXCLUDED.orders_count,
+            received_amount = r.received_amount + EXCLUDED.received_amount,
+            received_usd = r.received_usd + EXCLUDED.received_usd,
+            sent_usd = r.sent_usd + EXCLUDED.sent_usd,
+            commission_usd = r.commission_usd + EXCLUDED.commission_usd
+        """,
+        row["created_at"],
+        row["currency"] or "USD",
+        (status if status is not None else row["status"]) or "unknown",
+        sign,
+        sign * (row["received_amount"] or 0),
+        sign * (received_usd or 0),
+        sign * amount,
+        sign * commission,
     )
 
 
+async def refresh_rollups(conn, since: datetime):
+    """Пересчитать агрегаты начиная с часа ``since`` по таблице orders.
+
+    Инкрементальная сверка: затрагивает только свежие бакеты, поэтому
+    дешёвая и исправляет расхождения после ручных правок orders.
+    """
+    async with conn.transaction():
+        await conn.execute(
+            "DELETE FROM orders_rollup_hourly WHERE bucket >= date_trunc('hour', $1::timestamp)",
+            since,
+        )
+        await conn.execute(
+            """
+            INSERT INTO orders_rollup_hourly (
+                bucket, currency, status, orders_count,
+                received_amount, received_usd, sent_usd, commission_usd
+            )
+            SELECT date_trunc('hour', created_at),
+                   COALESCE(currency, 'USD'),
+                   COALESCE(status, 'unknown'),
+                   COUNT(*),
+                   COALESCE(SUM(received_amount), 0),
+                   COALESCE(SUM(received_usd), 0),
+                   COALESCE(SUM(amount), 0),
+                   COALESCE(SUM(received_usd - amount) FILTER (WHERE received_usd IS NOT NULL), 0)
+            FROM orders
+            WHERE created_at >= date_trunc('hour', $1::timestamp)
+            GROUP BY 1, 2, 3
+            """,
+            since,
+        )
+
+
+@traced("db.get_rollup_stats")
+async def get_rollup_stats(conn, granularity: str, since: datetime, until: datetime | None = None):
+    """Агрегаты по часам/дням, валюте и статусу из orders_rollup_hourly."""
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    rows = await conn.fetch(
+        """
+        SELECT date_trunc($1, bucket) AS bucket, currency, status,
+               SUM(orders_count)::BIGINT AS orders_count,
+               SUM(received_amount) AS received_amount,
+               SUM(received_usd) AS received_usd,
+               SUM(sent_usd) AS sent_usd,
+               SUM(commission_usd) AS commission_usd
+        FROM orders_rollup_hourly
+        WHERE bucket >= date_trunc($1, $2::timestamp)
+          AND ($3::timestamp IS NULL OR bucket < $3::timestamp)
+        GROUP BY 1, 2, 3
+        HAVING SUM(orders_count) <> 0
+        ORDER BY 1, 2, 3
+        """,
+        granularity, since, until
+    )
+    return [dict(r) for r in rows]
+
+
+@traced("db.get_order_by_id")
 async def get_order_by_id(conn, id: str):
     """Получить заказ по ID"""
-    row = await conn.fetchrow("SELECT * FROM orders WHERE id=$1", id)
+    row = await conn.fetchrow(SQL_ORDER_BY_ID, id)
+    return dict(row) if row else None
+
+
+@traced("db.get_order_by_external_id")
+async def get_order_by_external_id(conn, external_id: str):
+    """Получить заказ по external_id"""
+    row = await conn.fetchrow(SQL_ORDER_BY_EXTERNAL_ID, external_id)
     return dict(row) if row else None
 
 
+@traced("db.order_exists_by_external_id")
+async def order_exists_by_external_id(conn, external_id: str) -> bool:
+    """Проверить, обработан ли уже заказ с таким external_id"""
+    return await conn.fetchrow(SQL_ORDER_EXISTS_BY_EXTERNAL_ID, external_id) is not None
+
+
+@traced("db.get_orders")
 async def get_orders(conn, offset: int = 0, limit: int = 10):
     """Получить список заказов с пагинацией"""
     rows = await conn.fetch(
@@ -0,0 +1,70 @@
+"""Сборка FastAPI-приложения — общая для ``app/main.py`` и ``main.py``."""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from .db import close_pool
+from .config import DRAIN_TIMEOUT, TRACE_OTLP_ENDPOINT, CAPTURE_ENABLED
+from .lifecycle import start_db, warm_up, drain, install_signal_handlers
+from .logging_config import setup_logging, RequestContextMiddleware
+from .metrics import MetricsMiddleware, metrics_endpoint
+from .services import close_clients, account_balances_loop
+from .routes import router, resume_pending_operations
+from .stats import refresh_stats_loop, router as stats_router
+from .tracing import TracingMiddleware, export_loop, router as tracing_router
+from .responses import FastJSONResponse
+from .profiling import monitor_event_loop
+
+logger = logging.getLogger("playwallet")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("🚀 Starting PlayWallet v2.0...")
+    install_signal_handlers()
+    await start_db()
+    tasks = [
+        asyncio.create_task(warm_up()),
+        asyncio.create_task(refresh_stats_loop()),
+        asyncio.create_task(account_balances_loop()),
+        asyncio.create_task(resume_pending_operations()),
+        asyncio.create_task(monitor_event_loop()),
+    ]
+    if TRACE_OTLP_ENDPOINT:
+        tasks.append(asyncio.create_task(export_loop()))
+    yield
+    await drain(DRAIN_TIMEOUT)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await close_clients()
+    await close_pool()
+    logger.info("🛑 PlayWallet stopped")
+
+
+def create_app() -> FastAPI:
+    setup_logging("app")
+    app = FastAPI(
+        title="PlayWallet API v2.0",
+        description="Автоматическое пополнение Steam с защитой от мошенничества",
+        version="2.0.0",
+        docs_url="/docs",
+        redoc_url="/redoc",
+        lifespan=lifespan,
+        default_response_class=FastJSONResponse,
+    )
+
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(RequestContextMiddleware)
+    if CAPTURE_ENABLED:
+        from .capture import CaptureMiddleware
+
+        app.add_middleware(CaptureMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    app.include_router(router)
+    app.include_router(stats_router)
+    app.include_router(tracing_router)
+    return app
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import signal
+import time
+from contextlib import asynccontextmanager
+
+from structlog.contextvars import bind_contextvars, bound_contextvars, unbind_contextvars
+
+from .config import WARMUP_CURRENCIES, WARMUP_STEP_TIMEOUT
+from .db import init_pool, get_conn, release_conn, save_pending_operation
+from .metrics import ORDERS_IN_FLIGHT
+from .services import refresh_account_balances, get_digiseller_token, get_usd_rate
+
+logger = logging.getLogger(__name__)
+
+_ready = False
+_draining = False
+# Операции с заказами в процессе: key (external_id) -> состояние операции
+_in_flight: dict[str, dict] = {}
+# Длительность фаз старта в секундах (для логов и отладки)
+phase_timings: dict[str, float] = {}
+
+
+def is_ready() -> bool:
+    """Готов ли инстанс принимать трафик (см. /health/ready)."""
+    return _ready
+
+
+def set_ready(value: bool):
+    global _ready
+    _ready = value
+
+
+async def _timed(name: str, coro, *, required: bool = False):
+    """Выполнить шаг старта, залогировать его длительность.
+
+    Необязательные шаги (прогрев внешних API) не валят старт: ошибка
+    логируется, инстанс всё равно становится готовым.
+    """
+    start = time.perf_counter()
+    try:
+        if required:
+            await coro
+        else:
+            await asyncio.wait_for(coro, WARMUP_STEP_TIMEOUT)
+        outcome = "ok"
+    except Exception as exc:
+        if required:
+            raise
+        outcome = f"failed: {exc!r}"
+    finally:
+        phase_timings[name] = time.perf_counter() - start
+    logger.info("Startup phase %s: %.3fs (%s)", name, phase_timings[name], outcome)
+
+
+async def start_db():
+    """Открыть пул (DB_POOL_MIN_SIZE соединений с подготовленными запросами)."""
+    await _timed("db_pool", init_pool(), required=True)
+
+
+async def warm_up():
+    """Прогреть внешние зависимости и перевести инстанс в состояние ready."""
+    start = time.perf_counter()
+    await asyncio.gather(
+        _timed("digiseller_token", get_digiseller_token()),
+        _timed("playwallet_balances", refresh_account_balances()),
+        *(_timed(f"fx_{currency}", get_usd_rate(currency)) for currency in WARMUP_CURRENCIES),
+    )
+    phase_timings["warm_up"] = time.perf_counter() - start
+    if _draining:
+        return
+    set_ready(True)
+    logger.info(
+        "Warm-up finished in %.3fs, instance is ready | %s",
+        phase_timings["warm_up"],
+        ", ".join(f"{k}={v:.3f}s" for k, v in phase_timings.items()),
+    )
+
+
+# =================== Остановка и незавершённые операции ===================
+
+def is_draining() -> bool:
+    """Идёт ли остановка инстанса (новые операции с заказами не принимаются)."""
+    return _draining
+
+
+def start_draining():
+    global _draining
+    if not _draining:
+        logger.info("Draining: readiness=false, %d order operation(s) in flight", len(_in_flight))
+    _draining = True
+    set_ready(False)
+
+
+def install_signal_handlers():
+    """Перевести инстанс в draining сразу по SIGTERM/SIGINT.
+
+    Обработчик сервера (uvicorn) вызывается следом, поэтому штатная
+    остановка не меняется — только readiness гаснет раньше.
+    """
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            previous = signal.getsignal(sig)
+        except ValueError:
+            return
+
+        def handler(signum, frame, previous=previous):
+            start_draining()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                signal.signal(signum, previous)
+                signal.raise_signal(signum)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            # не главный поток — сигналы недоступны
+            return
+
+
+def is_in_flight(key: str) -> bool:
+    return key in _in_flight
+
+
+def mark_stage(op: dict, stage: str, **context):
+    """Отметить стадию операции и данные, нужные для её продолжения."""
+    op["stage"] = stage
+    op["context"].update(context)
+    if "order" in context:
+        bind_contextvars(order_id=context["order"].get("id"))
+
+
+async def _persist(op: dict):
+    conn = await get_conn()
+    try:
+        await save_pending_operation(conn, op["key"], op["kind"], op["stage"], op["context"])
+    finally:
+        await release_conn(conn)
+    logger.warning("Saved unfinished %s %s at stage %s", op["kind"], op["key"], op["stage"])
+
+
+@asynccontextmanager
+async def track_operation(key: str, kind: str, **context):
+    """Учитывать операцию с заказом как выполняющуюся.
+
+    Если операцию отменили (остановка по таймауту), её текущая стадия
+    сохраняется в pending_operations для продолжения после перезапуска.
+    Вторая операция с тем же ключом не регистрируется (RuntimeError):
+    иначе она затёрла бы первую, и drain() потерял бы её задачу.
+    """
+    if key in _in_flight:
+        raise RuntimeError(f"Operation {key} is already in flight")
+    op = {
+        "key": key,
+        "kind": kind,
+        "stage": "received",
+        "context": dict(context),
+        "task": asyncio.current_task(),
+    }
+    _in_flight[key] = op
+    ORDERS_IN_FLIGHT.inc()
+    try:
+        with bound_contextvars(external_id=key, operation=kind):
+            yield op
+    except asyncio.CancelledError:
+        try:
+            await _persist(op)
+        except Exception:
+            logger.exception("Failed to save unfinished %s %s: %s", kind, key, op)
+        raise
+    finally:
+        unbind_contextvars("order_id")
+        _in_flight.pop(key, None)
+        ORDERS_IN_FLIGHT.dec()
+
+
+async def drain(timeout: float):
+    """Дождаться завершения операций; оставшиеся по дедлайну отменить и сохранить."""
+    start_draining()
+    deadline = time.monotonic() + timeout
+    while _in_flight and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    if not _in_flight:
+        logger.info("Drain complete, no order operations in flight")
+        return
+
+    tasks = [op["task"] for op in _in_flight.values() if op["task"] is not None]
+    logger.warning("Drain deadline reached, cancelling %d order operation(s)", len(tasks))
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
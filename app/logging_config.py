@@ -0,0 +1,250 @@
+"""Общая настройка логирования для API и auto_topup.
+
+Записи (stdlib ``logging`` и ``structlog``) рендерятся в JSON-строки в
+вызывающем потоке, а запись в файл/stdout выполняет ``QueueListener`` в
+отдельном потоке — event loop не блокируется на диске.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import structlog
+from structlog.contextvars import bound_contextvars, merge_contextvars
+
+from .config import parse_pw_accounts
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DIR = os.getenv("LOG_DIR", "/app/logs")
+# Доля DEBUG-записей, которые реально пишутся (0..1)
+try:
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+except ValueError:
+    LOG_DEBUG_SAMPLE_RATE = 0.1
+# Строковые значения длиннее этого обрезаются (сырые ответы API и т.п.)
+try:
+    LOG_MAX_VALUE_LEN = int(os.getenv("LOG_MAX_VALUE_LEN", "2000"))
+except ValueError:
+    LOG_MAX_VALUE_LEN = 2000
+
+_listener: QueueListener | None = None
+
+# ---------- редактирование секретов ----------
+
+_SECRET_ENV_RE = re.compile(r"(TOKEN|SECRET|PASSWORD|API_KEY)$")
+_SECRET_NAME = r"(?<![a-z0-9])(?:token|secret|password|api[_-]?key|pw-api-key|x-bapi-sign|sign)"
+_SECRET_PAIR_RE = re.compile(
+    rf"""(?ix)
+    ({_SECRET_NAME})                    # имя поля (не часть слова: design, assign)
+    (["']?\s*[:=]\s*)                   # разделитель
+    ("(?:\\.|[^"\\])*"                  # значение в кавычках (с пробелами)
+    |'(?:\\.|[^'\\])*'
+    |[^"'&\s,;}}]+)                     # или без кавычек
+    """
+)
+# Ключ словаря, значение которого целиком секрет
+_SECRET_KEY_RE = re.compile(rf"(?i){_SECRET_NAME}$")
+# Глубже этого вложенные структуры пишутся строкой
+_MAX_DEPTH = 8
+_TG_BOT_TOKEN_RE = re.compile(r"bot\d+:[\w-]+")
+
+
+def _secret_values() -> list[str]:
+    values = {v for k, v in os.environ.items() if _SECRET_ENV_RE.search(k) and v and len(v) >= 6}
+    # токены аккаунтов PlayWallet лежат внутри JSON в PW_ACCOUNTS
+    try:
+        values.update(str(acc["token"]) for acc in parse_pw_accounts(os.getenv("PW_ACCOUNTS")))
+    except (ValueError, TypeError, AttributeError):
+        pass  # некорректный PW_ACCOUNTS — ошибку покажет app/config.py
+    return sorted((v for v in values if len(v) >= 6), key=len, reverse=True)
+
+
+# Заполняется в setup_logging(), когда .env уже загружен
+_SECRETS: list[str] = []
+
+
+def redact(text: str) -> str:
+    """Замаскировать секреты из окружения и пары вида ``token=...`` в строке."""
+    for secret in _SECRETS:
+        if secret in text:
+            text = text.replace(secret, "***")
+    text = _TG_BOT_TOKEN_RE.sub("bot***", text)
+    return _SECRET_PAIR_RE.sub(_mask_pair, text)
+
+
+def _mask_pair(m: re.Match) -> str:
+    quote = m[3][0] if m[3][0] in "\"'" else ""
+    return f"{m[1]}{m[2]}{quote}***{quote}"
+
+
+def _is_secret(key, value) -> bool:
+    """Значение поля ``key`` целиком секрет (token, api_key, pw-api-key, ...)."""
+    return isinstance(key, str) and value is not None and bool(_SECRET_KEY_RE.search(key))
+
+
+def _truncate(value: str) -> str:
+    if len(value) > LOG_MAX_VALUE_LEN:
+        return f"{value[:LOG_MAX_VALUE_LEN]}…(+{len(value) - LOG_MAX_VALUE_LEN} chars)"
+    return value
+
+
+def _redact_value(value, depth: int = 0):
+    """Замаскировать секреты в значении, сохранив dict/list как JSON-структуру."""
+    if isinstance(value, str):
+        return _truncate(redact(value))
+    if depth >= _MAX_DEPTH or isinstance(value, bytes):
+        return _truncate(redact(repr(value)))
+    if isinstance(value, dict):
+        return {
+            (k if isinstance(k, str) else str(k)):
+                "***" if _is_secret(k, value[k]) else _redact_value(value[k], depth + 1)
+            for k in value
+        }
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_redact_value(v, depth + 1) for v in value]
+    return value
+
+
+def _redact_and_truncate(_, __, event_dict: dict) -> dict:
+    for key, value in event_dict.items():
+        if key.startswith("_"):
+            continue
+        if _is_secret(key, value):
+            event_dict[key] = "***"
+        elif key in ("exception", "stack") and isinstance(value, str):
+            event_dict[key] = redact(value)
+        else:
+            event_dict[key] = _redact_value(value)
+    return event_dict
+
+
+# ---------- сэмплирование ----------
+
+class DebugSampler(logging.Filter):
+    """Пропускает только долю LOG_DEBUG_SAMPLE_RATE DEBUG-записей."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG:
+            return True
+        return random.random() < LOG_DEBUG_SAMPLE_RATE
+
+
+# ---------- настройка ----------
+
+def setup_logging(service: str, level: str = LOG_LEVEL) -> None:
+    """Настроить корневой логгер: JSON-строки через очередь в файл и stdout.
+
+    Файл — ``LOG_DIR/<service>.log`` (с ротацией); если каталог
+    недоступен, пишем только в stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    _SECRETS[:] = _secret_values()
+
+    def add_service(_, __, event_dict: dict) -> dict:
+        event_dict.setdefault("service", service)
+        return event_dict
+
+    shared = [
+        merge_contextvars,
+        add_service,
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.add_logger_name,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+    ]
+    formatter = structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=[*shared, structlog.stdlib.ExtraAdder()],
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            _redact_and_truncate,
+            structlog.processors.EventRenamer("message"),
+            structlog.processors.JSONRenderer(ensure_ascii=False),
+        ],
+    )
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            *shared,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            structlog.processors.StackInfoRenderer(),
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    handlers: list[logging.Handler] = []
+    log_path = os.path.join(LOG_DIR, f"{service}.log")
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        handlers.append(RotatingFileHandler(log_path, maxBytes=5_000_000, backupCount=5, encoding="utf-8"))
+    except (OSError, PermissionError) as exc:
+        sys.stderr.write(f"[{service}] Unable to open log file '{log_path}': {exc}. Falling back to stdout only.\n")
+    handlers.append(logging.StreamHandler(sys.stdout))
+
+    # Уже готовая JSON-строка приходит в record.message (см. QueueHandler.prepare)
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.setFormatter(formatter)
+    queue_handler.addFilter(DebugSampler())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uv_logger = logging.getLogger(name)
+        uv_logger.handlers[:] = []
+        uv_logger.propagate = True
+
+    _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Дописать очередь и остановить поток записи логов."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# ---------- корреляция запросов ----------
+
+class RequestContextMiddleware:
+    """Привязывает request_id (из X-Request-ID или новый) ко всем логам запроса."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers") or ():
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        with bound_contextvars(request_id=request_id):
+            await self.app(scope, receive, send_wrapper)
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
 import time
-from fastapi import APIRouter, Response
-from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+from typing import TYPE_CHECKING
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+if TYPE_CHECKING:
+    from starlette.responses import Response
 
 REQUEST_COUNT = Counter(
     "http_requests_total",
@@ -17,6 +21,93 @@ REQUEST_LATENCY = Histogram(
     buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
 )
 
+ORDERS_IN_FLIGHT = Gauge(
+    "playwallet_orders_in_flight",
+    "Order operations (callback/admin topup) currently being processed",
+)
+
+ADMISSION_DECISIONS = Counter(
+    "playwallet_admission_total",
+    "Admission control decisions for order operations",
+    labelnames=("decision", "reason"),
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "playwallet_admission_queue_depth",
+    "Order operations waiting for an admission slot",
+)
+
+UPSTREAM_LATENCY_EWMA = Gauge(
+    "playwallet_upstream_latency_ewma_seconds",
+    "Exponentially weighted PlayWallet API latency used for load shedding",
+)
+
+PW_ACCOUNT_BALANCE = Gauge(
+    "playwallet_account_balance",
+    "Last known PlayWallet account balance (USD)",
+    labelnames=("account",),
+)
+
+PW_ACCOUNT_LATENCY = Gauge(
+    "playwallet_account_latency_ewma_seconds",
+    "Exponentially weighted PlayWallet API latency per account",
+    labelnames=("account",),
+)
+
+PW_ACCOUNT_ERROR_RATE = Gauge(
+    "playwallet_account_error_rate",
+    "Share of failed PlayWallet API calls per account over the recent window",
+    labelnames=("account",),
+)
+
+PW_ACCOUNT_ORDERS = Counter(
+    "playwallet_account_orders_total",
+    "Orders routed to each PlayWallet account",
+    labelnames=("account",),
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between scheduled and actual wake-up of the event loop monitor",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+EVENT_LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total",
+    "Event loop stalls longer than LOOP_SLOW_CALLBACK_MS",
+)
+
+# Денежный поток за текущие сутки (UTC) из orders_rollup_hourly, см. app/stats.py
+ORDERS_TODAY = Gauge(
+    "playwallet_orders_today",
+    "Orders created today",
+    labelnames=("currency", "status"),
+)
+
+RECEIVED_TODAY = Gauge(
+    "playwallet_received_amount_today",
+    "Amount received from buyers today in payment currency",
+    labelnames=("currency", "status"),
+)
+
+RECEIVED_USD_TODAY = Gauge(
+    "playwallet_received_usd_today",
+    "Amount received from buyers today converted to USD",
+    labelnames=("currency", "status"),
+)
+
+SENT_USD_TODAY = Gauge(
+    "playwallet_sent_usd_today",
+    "Amount sent to PlayWallet today in USD",
+    labelnames=("currency", "status"),
+)
+
+COMMISSION_USD_TODAY = Gauge(
+    "playwallet_commission_usd_today",
+    "Commission earned today in USD",
+    labelnames=("currency", "status"),
+)
+
 
 class MetricsMiddleware:
     """Collects basic Prometheus metrics for each request."""
@@ -53,11 +144,12 @@ class MetricsMiddleware:
             REQUEST_LATENCY.labels(method=method, path=path, status=status).observe(duration)
 
 
-router = APIRouter()
-
-
-@router.get("/metrics", include_in_schema=False)
-async def metrics_endpoint() -> Response:
+# Подключается через app.add_route (см. app/factory.py): модуль не
+# импортирует FastAPI/starlette при загрузке, чтобы его могли использовать
+# процессы без HTTP (auto_topup)
+async def metrics_endpoint(request) -> Response:
     """Expose Prometheus metrics."""
+    from starlette.responses import Response
+
     data = generate_latest()
     return Response(content=data, media_type=CONTENT_TYPE_LATEST)
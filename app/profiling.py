@@ -0,0 +1,159 @@
+"""Наблюдение за event loop и сэмплирующий профайлер.
+
+``monitor_event_loop`` раз в LOOP_LAG_INTERVAL замеряет, насколько позже
+запланированного просыпается loop (histogram ``event_loop_lag_seconds``).
+Параллельно сторожевой поток следит за тем же «пульсом»: если loop не
+отвечает дольше LOOP_SLOW_CALLBACK_MS, он снимает стек потока loop прямо
+во время блокировки и пишет его в лог — видно, какой код держит loop.
+
+``sample_profile`` — статистический профайлер: с частотой PROFILE_HZ
+снимает стеки всех потоков через ``sys._current_frames()`` и отдаёт их в
+collapsed-формате (``frame;frame;frame count``), который принимают
+flamegraph.pl, speedscope и inferno (эндпоинт — ``/admin/profile`` в
+app/routes.py). Модуль не зависит от FastAPI — его использует и auto_topup.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from .config import LOOP_LAG_INTERVAL, LOOP_SLOW_CALLBACK_MS, PROFILE_HZ
+from .metrics import EVENT_LOOP_LAG, EVENT_LOOP_BLOCKED
+
+logger = logging.getLogger(__name__)
+
+
+# =================== Задержка event loop ===================
+
+class _Watchdog(threading.Thread):
+    """Поток, снимающий стек loop, пока тот заблокирован."""
+
+    def __init__(self, loop_thread_id: int, interval: float, threshold: float):
+        super().__init__(name="loop-watchdog", daemon=True)
+        self.loop_thread_id = loop_thread_id
+        # «пульс» приходит раз в interval секунд, задержкой считается сверх него
+        self.interval = interval
+        self.threshold = threshold
+        self.heartbeat = time.monotonic()
+        self._reported = 0.0
+        self._stop_event = threading.Event()
+
+    def beat(self):
+        self.heartbeat = time.monotonic()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.threshold / 2):
+            heartbeat = self.heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold or self._reported == heartbeat:
+                continue
+            # один отчёт на одну блокировку
+            self._reported = heartbeat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            EVENT_LOOP_BLOCKED.inc()
+            logger.warning(
+                "Event loop blocked for %.0f ms", blocked * 1000,
+                extra={"stack": "".join(traceback.format_stack(frame))},
+            )
+
+
+async def monitor_event_loop(interval: float = LOOP_LAG_INTERVAL, slow_ms: float = LOOP_SLOW_CALLBACK_MS):
+    """Фоновая задача: замер задержки loop и поиск блокирующего кода."""
+    watchdog = _Watchdog(threading.get_ident(), interval, slow_ms / 1000)
+    watchdog.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - start - interval)
+            watchdog.beat()
+            EVENT_LOOP_LAG.observe(lag)
+            if lag * 1000 >= slow_ms:
+                logger.warning("Event loop lag %.0f ms", lag * 1000)
+    finally:
+        watchdog.stop()
+
+
+# =================== Сэмплирующий профайлер ===================
+
+_profile_lock = threading.Lock()
+
+
+def _collapse(frame, thread_name: str) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+def sample_profile(seconds: float, hz: int = PROFILE_HZ) -> str:
+    """Снять стеки всех потоков за ``seconds`` секунд (блокирующий вызов).
+
+    Возвращает collapsed stacks: по строке на уникальный стек с числом
+    выборок. Одновременно может идти только один профиль.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("Profiling is already running")
+    try:
+        me = threading.get_ident()
+        period = 1.0 / max(1, hz)
+        counts: Counter[str] = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != me:
+                    counts[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+            time.sleep(period)
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+    finally:
+        _profile_lock.release()
+
+
+def install_profile_signal(service: str, directory: str, seconds: float = 30, sig=signal.SIGUSR1):
+    """По сигналу (``kill -USR1 <pid>``) снять профиль и записать его в файл.
+
+    Для процессов без HTTP (auto_topup). Профиль пишется в
+    ``<directory>/profile-<service>-<время>.collapsed`` фоновым потоком.
+    """
+
+    def write_profile():
+        try:
+            data = sample_profile(seconds)
+        except RuntimeError as e:
+            logger.warning("Profile skipped: %s", e)
+            return
+        path = os.path.join(directory, f"profile-{service}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning("Unable to write profile %s: %s", path, e)
+            return
+        logger.info("Profile written to %s (%d stacks)", path, data.count("\n"))
+
+    def handler(signum, frame):
+        logger.info("Profiling %s for %.0fs", service, seconds)
+        threading.Thread(target=write_profile, name="profiler", daemon=True).start()
+
+    try:
+        signal.signal(sig, handler)
+    except (ValueError, AttributeError):
+        # не главный поток или платформа без SIGUSR1
+        pass
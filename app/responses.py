@@ -0,0 +1,37 @@
+"""JSON-ответ на orjson — класс ответа по умолчанию для приложения.
+
+Ответы с ``response_model`` приходят сюда уже сериализованными pydantic
+(JSON-совместимые dict/list), остаётся быстро превратить их в байты.
+Для ответов без модели orjson сам обрабатывает datetime/UUID, а Decimal
+переводится так же, как в ``jsonable_encoder``: целое — int, иначе float.
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,21 +1,50 @@
 from fastapi import HTTPException, APIRouter, Request, Query, Response, status
-import os, uuid, math, traceback, time, hashlib
+from fastapi.responses import PlainTextResponse
+import asyncio, uuid, math, time, traceback, logging
 from datetime import datetime
-import httpx
 
-from .services import get_balance, create_order, pay_order, get_usd_rate
-from .db import get_conn, release_conn, insert_order, update_order_status, ping
+from .services import (
+    get_balance,
+    create_order,
+    pay_order,
+    get_usd_rate,
+    get_client,
+    get_digiseller_token,
+)
+from .db import (
+    get_conn,
+    release_conn,
+    insert_order,
+    update_order_status,
+    ping,
+    order_exists_by_external_id,
+    get_order_by_external_id,
+    claim_pending_operations,
+    flag_pending_for_review,
+    save_pending_operation,
+)
+from .lifecycle import is_ready, is_draining, is_in_flight, mark_stage, track_operation
 from .telegram_utils import notify
-from .config import DEFAULT_SERVICE_ID, COMMISSION_RATE, MIN_SEND_USD
+from .tracing import span
+from .admission import admission
+from .accounts import accounts
+from .metrics import PW_ACCOUNT_ORDERS
+from .schemas import OkOut, HealthOut, BalanceOut, AdminTopupOut, OrderOut
+from .config import (
+    DEFAULT_SERVICE_ID,
+    COMMISSION_RATE,
+    MIN_SEND_USD,
+    ADMIN_SECRET,
+    DRAIN_RETRY_AFTER,
+    DIGISELLER_API_URL,
+    PROFILE_HZ,
+    PROFILE_MAX_SECONDS,
+)
+from .profiling import sample_profile
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-ADMIN_SECRET = os.getenv("ADMIN_SECRET")
-
-DIGI_SELLER_ID = os.getenv("DIGISELLER_SELLER_ID")
-DIGI_API_KEY = os.getenv("DIGISELLER_API_KEY")
-
-_digi_token: str | None = None
-_digi_token_expire: float = 0.0
 
 def parse_created_dt(dt_str: str | None):
     try:
@@ -23,13 +52,27 @@ def parse_created_dt(dt_str: str | None):
     except Exception:
         return None
 
-@router.get("/")
+@router.get("/", response_model=OkOut, response_model_exclude_none=True)
 async def root():
     return {"ok": True}
 
 
-@router.get("/health", include_in_schema=False)
+@router.get("/health/live", response_model=HealthOut, include_in_schema=False)
+async def liveness_check():
+    return {"status": "alive"}
+
+
+@router.head("/health/live", include_in_schema=False)
+async def liveness_check_head():
+    return Response(status_code=status.HTTP_200_OK)
+
+
+# /health оставлен для совместимости (Docker HEALTHCHECK, nginx) и равен readiness
+@router.get("/health", response_model=HealthOut, include_in_schema=False)
+@router.get("/health/ready", response_model=HealthOut, include_in_schema=False)
 async def health_check():
+    if not is_ready():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="warming up")
     try:
         await ping()
     except Exception as exc:
@@ -38,41 +81,98 @@ async def health_check():
 
 
 @router.head("/health", include_in_schema=False)
+@router.head("/health/ready", include_in_schema=False)
 async def health_check_head():
     await health_check()
     return Response(status_code=status.HTTP_200_OK)
 
 # -------- PlayWallet balance proxy (для удобной проверки из браузера) --------
-@router.get("/balance")
-async def balance_route():
-    data = await get_balance()
-    # возвращаем как есть, но дублируем ключ balance
-    return {"ok": True, **data}
-
-# =================== Авторизация и токен Digiseller ===================
-async def get_digiseller_token() -> str | None:
-    global _digi_token, _digi_token_expire
-    if _digi_token and time.time() < _digi_token_expire:
-        return _digi_token
-
-    ts = str(int(time.time() * 1000))
-    sign = hashlib.sha256(f"{DIGI_API_KEY}{ts}".encode()).hexdigest()
-    payload = {"seller_id": int(DIGI_SELLER_ID), "timestamp": ts, "sign": sign}
+@router.get("/balance", response_model=BalanceOut)
+async def balance_route(account: str | None = Query(None)):
+    try:
+        acc = accounts.get(account)
+    except KeyError:
+        raise HTTPException(404, f"Неизвестный аккаунт PlayWallet: {account}")
+    data = await get_balance(acc)
+    # ответ PlayWallet (status/data) плюс сводка по всем аккаунтам пула
+    return {
+        "ok": True,
+        "status": data.get("status"),
+        "data": data.get("data"),
+        "account": acc.name,
+        "accounts": [a.as_dict() for a in accounts.accounts],
+    }
+
+# =================== Создание и оплата заказа ===================
+def _retry_later(detail: str = "Сервис перезапускается, повторите позже") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": str(DRAIN_RETRY_AFTER)},
+    )
+
 
+async def _create_order(op: dict, *, external_id: str, amount: float, login: str):
+    """Выбрать аккаунт PlayWallet и создать на нём заказ.
+
+    Выбор записывается в контекст операции, чтобы оплата (в том числе
+    после перезапуска) шла через тот же аккаунт.
+    """
+    account = accounts.choose(amount)
+    mark_stage(op, "creating", login=login, account=account.name)
+    resp = await create_order(
+        external_id=external_id,
+        service_id=DEFAULT_SERVICE_ID,
+        amount=amount,
+        login=login,
+        account=account,
+    )
+    if resp.get("status") == "success":
+        account.reserve(amount)
+        PW_ACCOUNT_ORDERS.labels(account=account.name).inc()
+    return resp
+
+
+async def _store_and_pay(op: dict, d: dict, login: str, **extra) -> dict:
+    """Сохранить созданный в PlayWallet заказ и оплатить его."""
+    created_dt = parse_created_dt(d.get("createdDateTime"))
+    account = accounts.get(op["context"].get("account"))
+
+    conn = await get_conn()
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.post("https://api.digiseller.com/api/apilogin", json=payload)
-            data = r.json()
-            if data.get("retval") == 0:
-                _digi_token = data.get("token")
-                _digi_token_expire = time.time() + 60 * 110
-                return _digi_token
-    except Exception:
-        pass
-    return None
+        await insert_order(conn, **{
+            "id": d["id"],
+            "external_id": d["externalId"],
+            "login": login,
+            "service_id": d["serviceId"],
+            "amount": float(d["amount"]),
+            "status": d["status"],
+            "created_datetime": created_dt,
+            "pw_account": account.name,
+            **extra,
+        })
+    finally:
+        await release_conn(conn)
+
+    mark_stage(op, "paying")
+    pay_resp = await pay_order(
+        order_id=d["id"],
+        external_id=d["externalId"],
+        created_datetime=created_dt,
+        account=account,
+    )
+
+    if pay_resp.get("status") == "success":
+        conn = await get_conn()
+        try:
+            await update_order_status(conn, id=d["id"], status="paid")
+        finally:
+            await release_conn(conn)
+
+    return pay_resp
 
 # =================== Callback от Plati ===================
-@router.get("/plati/callback")
+@router.get("/plati/callback", response_model=OkOut, response_model_exclude_none=True)
 async def plati_callback(
     uniquecode: str = Query(None),
     unique_code: str = Query(None),
@@ -81,15 +181,28 @@ async def plati_callback(
     code = unique_code or uniquecode
     if not code:
         raise HTTPException(400, "Не передан unique_code")
+    if is_draining():
+        raise _retry_later()
+    if is_in_flight(code):
+        # исход первой попытки ещё неизвестен: «ok» сейчас остановил бы
+        # повторы Digiseller, даже если она затем упадёт
+        raise _retry_later("Код уже обрабатывается, повторите позже")
+
+    # ключ регистрируется до очереди admission: повтор, пришедший, пока
+    # первый callback ждёт слота, увидит его в is_in_flight
+    async with track_operation(code, "plati_callback", login=login) as op, admission.admit():
+        return await _process_plati_code(op, code, login)
 
+
+async def _process_plati_code(op: dict, code: str, login: str | None):
     token = await get_digiseller_token()
     if not token:
         raise HTTPException(500, "Нет токена Digiseller")
 
     try:
-        url = f"https://api.digiseller.com/api/purchases/unique-code/{code}?token={token}"
-        async with httpx.AsyncClient(timeout=15) as client:
-            r = await client.get(url, headers={"Accept": "application/json"})
+        url = f"{DIGISELLER_API_URL}/api/purchases/unique-code/{code}?token={token}"
+        with span("digiseller.unique_code"):
+            r = await get_client().get(url, headers={"Accept": "application/json"}, timeout=15)
             data = r.json()
     except Exception as e:
         raise HTTPException(500, f"Ошибка проверки кода: {e}")
@@ -112,7 +225,7 @@ async def plati_callback(
     # дидемпотентность
     conn = await get_conn()
     try:
-        exists = await conn.fetchrow("SELECT 1 FROM orders WHERE external_id=$1", code)
+        exists = await order_exists_by_external_id(conn, code)
     finally:
         await release_conn(conn)
     if exists:
@@ -125,45 +238,16 @@ async def plati_callback(
         usd_before_fee = amount_raw * rate
         usd_after_fee = max(MIN_SEND_USD, math.floor(usd_before_fee * (1.0 - COMMISSION_RATE) * 100) / 100.0)
 
-        resp = await create_order(
-            external_id=code,
-            service_id=DEFAULT_SERVICE_ID,
-            amount=usd_after_fee,
-            login=login
-        )
+        resp = await _create_order(op, external_id=code, amount=usd_after_fee, login=login)
         if resp.get("status") != "success" or not (d := resp.get("data")):
             await notify(f"⚠️ Не удалось создать заказ {code}: {resp}")
             raise HTTPException(500, "Не удалось создать заказ")
 
-        created_dt = parse_created_dt(d.get("createdDateTime"))
-
-        conn = await get_conn()
-        try:
-            await insert_order(conn, **{
-                "id": d["id"],
-                "external_id": d["externalId"],
-                "login": login,
-                "service_id": d["serviceId"],
-                "amount": float(d["amount"]),
-                "status": d["status"],
-                "created_datetime": created_dt
-            })
-        finally:
-            await release_conn(conn)
-
-        pay_resp = await pay_order(
-            order_id=d["id"],
-            external_id=d["externalId"],
-            created_datetime=created_dt
-        )
+        extra = {"currency": currency, "received_amount": amount_raw, "received_usd": usd_before_fee}
+        mark_stage(op, "created", order=d, extra=extra)
+        pay_resp = await _store_and_pay(op, d, login, **extra)
 
         if pay_resp.get("status") == "success":
-            conn = await get_conn()
-            try:
-                await update_order_status(conn, id=d["id"], status="paid")
-            finally:
-                await release_conn(conn)
-
             await notify(
                 f"💰 Заказ {d['id']} оплачен\n"
                 f"📥 Получено: {amount_raw:.2f} {currency}\n"
@@ -181,7 +265,7 @@ async def plati_callback(
     return {"ok": True}
 
 # =================== Admin Topup ===================
-@router.post("/admin/topup")
+@router.post("/admin/topup", response_model=AdminTopupOut, response_model_exclude_none=True)
 async def admin_topup(
     request: Request,
     secret: str = Query(...),
@@ -190,64 +274,131 @@ async def admin_topup(
 ):
     if secret != ADMIN_SECRET:
         raise HTTPException(status_code=403, detail="Forbidden")
+    if is_draining():
+        raise _retry_later()
 
-    resp = await create_order(
-        external_id=f"manual_admin_{uuid.uuid4()}",
-        service_id=DEFAULT_SERVICE_ID,
-        amount=amount,
-        login=login
-    )
+    external_id = f"manual_admin_{uuid.uuid4()}"
+    async with track_operation(external_id, "admin_topup", login=login, amount=amount) as op, admission.admit():
+        resp = await _create_order(op, external_id=external_id, amount=amount, login=login)
 
-    if resp.get("status") == "success" and (d := resp.get("data")):
-        created_dt = parse_created_dt(d.get("createdDateTime"))
+        if resp.get("status") == "success" and (d := resp.get("data")):
+            mark_stage(op, "created", order=d, extra={})
+            pay_resp = await _store_and_pay(op, d, login)
 
-        conn = await get_conn()
-        try:
-            await insert_order(conn, **{
-                "id": d["id"],
-                "external_id": d["externalId"],
-                "login": login,
-                "service_id": d["serviceId"],
-                "amount": float(d["amount"]),
-                "status": d["status"],
-                "created_datetime": created_dt
-            })
-        finally:
-            await release_conn(conn)
+            if pay_resp.get("status") == "success":
+                await notify(f"🛠 Админ пополнил Steam\n👤 {login}\n💵 {amount:.2f} USD (без комиссии)")
+                return {"ok": True, "order_id": d["id"], "paid": True}
 
-        pay_resp = await pay_order(
-            order_id=d["id"],
-            external_id=d["externalId"],
-            created_datetime=created_dt
-        )
+            return {"ok": True, "order_id": d["id"], "paid": False}
 
-        if pay_resp.get("status") == "success":
-            conn = await get_conn()
-            try:
-                await update_order_status(conn, id=d["id"], status="paid")
-            finally:
-                await release_conn(conn)
+    return {"ok": False, "reason": resp}
+
+# =================== Продолжение после перезапуска ===================
+async def resume_pending_operations():
+    """Продолжить операции, сохранённые предыдущим инстансом при остановке.
+
+    received — callback Plati обрабатывается заново, а о прерванном
+    ручном пополнении уходит уведомление (заказ ещё не создан, повторять
+    его решает администратор); created — заказ уже создан в PlayWallet,
+    поэтому только сохраняется и оплачивается.
+    Операции с неизвестным исходом (creating/paying) не повторяются,
+    чтобы не оплатить заказ дважды: по ним уходит уведомление.
+    """
+    conn = await get_conn()
+    try:
+        claimed = await claim_pending_operations(conn)
+        review = await flag_pending_for_review(conn)
+    finally:
+        await release_conn(conn)
 
-            await notify(f"🛠 Админ пополнил Steam\n👤 {login}\n💵 {amount:.2f} USD (без комиссии)")
-            return {"ok": True, "order_id": d["id"], "paid": True}
+    for item in review:
+        await notify(
+            f"⚠️ Операция {item['key']} ({item['kind']}) прервана на стадии {item['stage']}, "
+            f"исход неизвестен — проверьте заказ вручную\n{item['context']}"
+        )
 
-        return {"ok": True, "order_id": d["id"], "paid": False}
+    for item in claimed:
+        key, ctx = item["key"], item["context"]
+        login = ctx.get("login")
+        if item["kind"] == "admin_topup" and item["stage"] == "received":
+            # заказ ещё не создавался, но ручное пополнение автоматически
+            # не повторяем — решение за администратором
+            logger.warning("Interrupted admin_topup %s at stage received, not resumed", key)
+            await notify(
+                f"⚠️ Ручное пополнение {key} прервано перезапуском до создания заказа "
+                f"(👤 {login}, 💵 {ctx.get('amount')} USD) — повторите его"
+            )
+            continue
+        op = None
+        try:
+            async with track_operation(key, item["kind"], **ctx) as op:
+                mark_stage(op, item["stage"])
+                if item["stage"] == "created":
+                    d = ctx["order"]
+                    pay_resp = await _store_and_pay(op, d, login, **ctx.get("extra", {}))
+                    paid = pay_resp.get("status") == "success"
+                    await notify(
+                        f"♻️ Заказ {d['id']} ({key}) продолжен после перезапуска: "
+                        f"{'оплачен' if paid else f'оплата не прошла: {pay_resp}'}"
+                    )
+                elif item["kind"] == "plati_callback":
+                    await _process_plati_code(op, key, login)
+                logger.info("Resumed %s %s from stage %s", item["kind"], key, item["stage"])
+        except HTTPException as exc:
+            if exc.status_code < 500:
+                logger.warning("Pending %s %s dropped: %s", item["kind"], key, exc.detail)
+                continue
+            logger.warning("Failed to resume %s %s: %s", item["kind"], key, exc.detail)
+        except Exception:
+            logger.exception("Failed to resume %s %s", item["kind"], key)
+        else:
+            continue
 
-    return {"ok": False, "reason": resp}
+        # сохраняем с той стадией, до которой дошли: если запрос на оплату
+        # уже ушёл, при следующем старте операция попадёт на ручную проверку
+        conn = await get_conn()
+        try:
+            await save_pending_operation(
+                conn, key, item["kind"],
+                op["stage"] if op else item["stage"],
+                op["context"] if op else ctx,
+            )
+        finally:
+            await release_conn(conn)
 
 # =================== Поиск заказа ===================
-@router.get("/orders/find")
+@router.get("/orders/find", response_model=OrderOut)
 async def find_order(external_id: str):
     if not external_id:
         raise HTTPException(400, "Укажи external_id")
 
     conn = await get_conn()
     try:
-        row = await conn.fetchrow("SELECT * FROM orders WHERE external_id = $1", external_id)
+        row = await get_order_by_external_id(conn, external_id)
     finally:
         await release_conn(conn)
 
     if not row:
         raise HTTPException(404, "Заказ не найден")
 
-    return dict(row)
+    return row
+
+# =================== Профилирование ===================
+@router.get("/admin/profile", response_class=PlainTextResponse)
+async def admin_profile(
+    secret: str = Query(...),
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    hz: int = Query(PROFILE_HZ, ge=1, le=1000),
+):
+    """Сэмплирующий профиль процесса за ``seconds`` секунд (collapsed stacks)."""
+    if secret != ADMIN_SECRET:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        data = await asyncio.to_thread(sample_profile, seconds, hz)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    filename = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+    return PlainTextResponse(
+        data,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
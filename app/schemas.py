@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from pydantic import BaseModel, Field
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
 
 class CreateOrderIn(BaseModel):
     external_id: str = Field(..., description="Your external order id")
@@ -16,3 +18,97 @@ class PlatiCallbackIn(BaseModel):
     amount: float = Field(..., description="Amount paid by buyer")
     login: str = Field(..., description="Steam login from buyer")
     service_id: str | None = Field(None, description="Optional PlayWallet service id override")
+
+
+# =================== Ответы API ===================
+# Денежные поля — float: NUMERIC из asyncpg приходит как Decimal и
+# валидируется в число, как и раньше отдавал jsonable_encoder.
+
+class OkOut(BaseModel):
+    ok: bool = True
+    message: str | None = None
+
+class HealthOut(BaseModel):
+    status: str
+
+class AccountOut(BaseModel):
+    name: str
+    balance: float | None = None
+    latency_ms: float
+    error_rate: float
+
+class PWBalanceData(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    balance: float | None = None
+
+class BalanceOut(BaseModel):
+    ok: bool = True
+    status: str | None = None
+    data: PWBalanceData | None = None
+    account: str
+    accounts: list[AccountOut]
+
+class AdminTopupOut(BaseModel):
+    ok: bool
+    order_id: str | None = None
+    paid: bool | None = None
+    reason: dict | None = None
+
+class OrderOut(BaseModel):
+    id: str
+    external_id: str | None = None
+    login: str | None = None
+    service_id: str | None = None
+    amount: float | None = None
+    status: str | None = None
+    created_at: datetime | None = None
+    created_datetime: datetime | None = None
+    currency: str | None = None
+    received_amount: float | None = None
+    received_usd: float | None = None
+    pw_account: str | None = None
+
+class StatsRowOut(BaseModel):
+    bucket: datetime
+    currency: str
+    status: str
+    orders_count: int
+    received_amount: float
+    received_usd: float
+    sent_usd: float
+    commission_usd: float
+
+class PaidTotalsOut(BaseModel):
+    orders_count: int
+    received_usd: float
+    sent_usd: float
+    commission_usd: float
+
+class StatsOut(BaseModel):
+    ok: bool = True
+    granularity: str
+    since: datetime
+    paid_totals: PaidTotalsOut
+    rows: list[StatsRowOut]
+
+class SpanOut(BaseModel):
+    name: str
+    span_id: str
+    parent_id: str | None = None
+    start_ns: int
+    duration_ms: float
+    attributes: dict
+    error: str | None = None
+
+class TraceOut(BaseModel):
+    trace_id: str
+    name: str
+    duration_ms: float
+    attributes: dict
+    spans: list[SpanOut]
+
+class TracesOut(BaseModel):
+    ok: bool = True
+    slow_ms: float
+    traces: list[TraceOut]
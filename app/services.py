@@ -1,19 +1,24 @@
+import time
+import asyncio
+import logging
 import httpx
 import hashlib
 from uuid import UUID
 from datetime import datetime
 from .config import (
-    PW_USE_PROD,
-    PW_DEV_URL,
-    PW_DEV_TOKEN,
-    PW_PROD_URL,
-    PW_PROD_TOKEN,
     PW_FORCE_IPV4,
+    FX_CACHE_TTL,
+    PW_BALANCE_REFRESH_INTERVAL,
+    DIGISELLER_SELLER_ID,
+    DIGISELLER_API_KEY,
+    DIGISELLER_API_URL,
+    FX_API_URL,
 )
+from .tracing import traced
+from .admission import admission
+from .accounts import PlayWalletAccount, accounts
 
-BASE_URL = (PW_PROD_URL if PW_USE_PROD else PW_DEV_URL).rstrip("/")
-TOKEN = PW_PROD_TOKEN if PW_USE_PROD else PW_DEV_TOKEN
-HEADERS = {"pw-api-key": TOKEN}
+logger = logging.getLogger(__name__)
 
 def _client_kwargs():
     timeout = httpx.Timeout(10.0, read=10.0)
@@ -22,32 +27,84 @@ def _client_kwargs():
         kw["transport"] = httpx.AsyncHTTPTransport(local_address="0.0.0.0")
     return kw
 
+# Общие клиенты: соединения (и TLS-сессии) переиспользуются между запросами.
+# "playwallet" — для API PlayWallet, "default" — Digiseller, FX, Telegram.
+_clients: dict[str, httpx.AsyncClient] = {}
+
+def get_client(name: str = "default") -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        if name == "playwallet":
+            client = httpx.AsyncClient(**_client_kwargs())
+        else:
+            client = httpx.AsyncClient(timeout=httpx.Timeout(15.0))
+        _clients[name] = client
+    return client
+
+async def close_clients():
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
+
+_fx_cache: dict[str, tuple[float, float]] = {}
+
+_digi_token: str | None = None
+_digi_token_expire: float = 0.0
+
 # -----------------------------
 # API calls
 # -----------------------------
 
-async def get_balance():
-    async with httpx.AsyncClient(**_client_kwargs()) as client:
-        r = await client.get(f"{BASE_URL}/get-balance", headers=HEADERS)
+async def _pw_request(account: PlayWalletAccount | None, method: str, path: str, **kwargs) -> dict:
+    """Запрос к API PlayWallet от имени аккаунта (по умолчанию — основного).
+
+    Учитывает лимит запросов аккаунта и записывает задержку/ошибки,
+    по которым выбирается аккаунт для следующих заказов. В admission
+    уходит только время HTTP-запроса, без ожидания в лимите аккаунта.
+    """
+    account = account or accounts.primary
+    await account.limiter.acquire()
+    start = time.monotonic()
+    ok = False
+    try:
+        r = await get_client("playwallet").request(
+            method, f"{account.base_url}{path}", headers=account.headers, **kwargs
+        )
         r.raise_for_status()
-        return r.json()
+        data = r.json()
+        ok = data.get("status", "success") == "success"
+        return data
+    finally:
+        elapsed = time.monotonic() - start
+        account.observe(elapsed, ok)
+        admission.observe_upstream(elapsed)
+
+@traced("playwallet.get_balance")
+async def get_balance(account: PlayWalletAccount | None = None):
+    return await _pw_request(account, "GET", "/get-balance")
 
-async def create_order(*, external_id: str, service_id: str, amount: float, login: str):
+@traced("playwallet.create_order")
+async def create_order(
+    *,
+    external_id: str,
+    service_id: str,
+    amount: float,
+    login: str,
+    account: PlayWalletAccount | None = None,
+):
     payload = {
         "externalId": str(external_id),
         "serviceId": str(service_id),
         "amount": f"{amount:.2f}",
         "login": login,
     }
-    async with httpx.AsyncClient(**_client_kwargs()) as client:
-        r = await client.post(f"{BASE_URL}/create-order/", json=payload, headers=HEADERS)
-        r.raise_for_status()
-        return r.json()
+    return await _pw_request(account, "POST", "/create-order/", json=payload)
 
 def _pay_token(order_id: str, created_datetime: str) -> str:
     return hashlib.sha512(f"{order_id}{created_datetime}".encode()).hexdigest()
 
-async def pay_order(order_id, external_id, created_datetime):
+@traced("playwallet.pay_order")
+async def pay_order(order_id, external_id, created_datetime, account: PlayWalletAccount | None = None):
     if isinstance(order_id, UUID):
         order_id = str(order_id)
     if isinstance(external_id, UUID):
@@ -56,36 +113,86 @@ async def pay_order(order_id, external_id, created_datetime):
         created_datetime = created_datetime.isoformat()
 
     payload = {"id": order_id, "externalId": external_id, "token": _pay_token(order_id, created_datetime)}
-    async with httpx.AsyncClient(**_client_kwargs()) as client:
-        r = await client.post(f"{BASE_URL}/pay-order/", json=payload, headers=HEADERS)
-        r.raise_for_status()
-        return r.json()
+    return await _pw_request(account, "POST", "/pay-order/", json=payload)
 
-async def get_order(order_id: str):
-    async with httpx.AsyncClient(**_client_kwargs()) as client:
-        r = await client.get(f"{BASE_URL}/get-order/{order_id}", headers=HEADERS)
-        r.raise_for_status()
-        return r.json()
-
-async def get_order_list(offset: int, limit: int):
-    async with httpx.AsyncClient(**_client_kwargs()) as client:
-        r = await client.get(
-            f"{BASE_URL}/get-order-list/",
-            params={"offset": offset, "limit": limit},
-            headers=HEADERS,
-        )
-        r.raise_for_status()
-        return r.json()
+@traced("playwallet.get_order")
+async def get_order(order_id: str, account: PlayWalletAccount | None = None):
+    return await _pw_request(account, "GET", f"/get-order/{order_id}")
+
+@traced("playwallet.get_order_list")
+async def get_order_list(offset: int, limit: int, account: PlayWalletAccount | None = None):
+    return await _pw_request(
+        account, "GET", "/get-order-list/", params={"offset": offset, "limit": limit}
+    )
+
+def _parse_balance(data: dict) -> float | None:
+    try:
+        return float((data.get("data") or {}).get("balance"))
+    except (TypeError, ValueError):
+        return None
+
+async def refresh_account_balances():
+    """Обновить балансы всех аккаунтов (для маршрутизации заказов)."""
+    async def refresh(account: PlayWalletAccount):
+        balance = _parse_balance(await get_balance(account))
+        if balance is not None:
+            account.set_balance(balance)
+
+    results = await asyncio.gather(*(refresh(a) for a in accounts.accounts), return_exceptions=True)
+    failed = [(a, r) for a, r in zip(accounts.accounts, results) if isinstance(r, Exception)]
+    for account, exc in failed:
+        logger.warning("PlayWallet balance refresh failed for %s: %r", account.name, exc)
+    if len(failed) == len(accounts.accounts):
+        raise failed[0][1]
+
+async def account_balances_loop():
+    """Фоновая задача: периодическое обновление балансов аккаунтов."""
+    while True:
+        await asyncio.sleep(PW_BALANCE_REFRESH_INTERVAL)
+        try:
+            await refresh_account_balances()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass  # уже залогировано по аккаунтам
 
+@traced("fx.get_usd_rate")
 async def get_usd_rate(currency: str) -> float:
-    if currency.upper() == "USD":
+    currency = currency.upper()
+    if currency == "USD":
         return 1.0
-    url = f"https://api.frankfurter.app/latest?from={currency.upper()}&to=USD"
+    cached = _fx_cache.get(currency)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+    url = f"{FX_API_URL}/latest?from={currency}&to=USD"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.get(url)
-            r.raise_for_status()
-            data = r.json()
-            return float(data["rates"]["USD"])
+        r = await get_client().get(url, timeout=10)
+        r.raise_for_status()
+        data = r.json()
+        rate = float(data["rates"]["USD"])
     except Exception:
         return 1.0
+    _fx_cache[currency] = (rate, time.monotonic() + FX_CACHE_TTL)
+    return rate
+
+# =================== Авторизация и токен Digiseller ===================
+@traced("digiseller.login")
+async def get_digiseller_token() -> str | None:
+    global _digi_token, _digi_token_expire
+    if _digi_token and time.time() < _digi_token_expire:
+        return _digi_token
+
+    ts = str(int(time.time() * 1000))
+    sign = hashlib.sha256(f"{DIGISELLER_API_KEY}{ts}".encode()).hexdigest()
+    payload = {"seller_id": int(DIGISELLER_SELLER_ID), "timestamp": ts, "sign": sign}
+
+    try:
+        r = await get_client().post(f"{DIGISELLER_API_URL}/api/apilogin", json=payload, timeout=10)
+        data = r.json()
+        if data.get("retval") == 0:
+            _digi_token = data.get("token")
+            _digi_token_expire = time.time() + 60 * 110
+            return _digi_token
+    except Exception:
+        pass
+    return None
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, HTTPException, Query
+
+from .config import ADMIN_SECRET, STATS_REFRESH_INTERVAL, STATS_REFRESH_HOURS
+from .db import get_conn, release_conn, refresh_rollups, get_rollup_stats, ROLLUP_GRANULARITIES
+from .schemas import StatsOut
+from .metrics import (
+    ORDERS_TODAY,
+    RECEIVED_TODAY,
+    RECEIVED_USD_TODAY,
+    SENT_USD_TODAY,
+    COMMISSION_USD_TODAY,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_TOTAL_FIELDS = ("orders_count", "received_usd", "sent_usd", "commission_usd")
+
+
+def _today_start() -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _export_gauges(rows: list[dict]):
+    """Выставить gauges за сутки из строк агрегата (granularity=day)."""
+    gauges = (
+        (ORDERS_TODAY, "orders_count"),
+        (RECEIVED_TODAY, "received_amount"),
+        (RECEIVED_USD_TODAY, "received_usd"),
+        (SENT_USD_TODAY, "sent_usd"),
+        (COMMISSION_USD_TODAY, "commission_usd"),
+    )
+    for gauge, _ in gauges:
+        gauge.clear()
+    for row in rows:
+        labels = {"currency": row["currency"], "status": row["status"]}
+        for gauge, field in gauges:
+            gauge.labels(**labels).set(float(row[field] or 0))
+
+
+async def refresh_stats():
+    """Сверить свежие агрегаты с orders и обновить Prometheus gauges."""
+    since = datetime.utcnow() - timedelta(hours=STATS_REFRESH_HOURS)
+    conn = await get_conn()
+    try:
+        await refresh_rollups(conn, since)
+        rows = await get_rollup_stats(conn, "day", _today_start())
+    finally:
+        await release_conn(conn)
+    _export_gauges(rows)
+
+
+async def refresh_stats_loop():
+    """Фоновая задача: периодический инкрементальный пересчёт агрегатов."""
+    while True:
+        try:
+            await refresh_stats()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Stats refresh failed")
+        await asyncio.sleep(STATS_REFRESH_INTERVAL)
+
+
+# =================== Статистика продаж ===================
+@router.get("/stats", response_model=StatsOut)
+async def stats(
+    secret: str = Query(...),
+    granularity: str = Query("day"),
+    days: int = Query(7, ge=1, le=366),
+):
+    if secret != ADMIN_SECRET:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if granularity not in ROLLUP_GRANULARITIES:
+        raise HTTPException(400, f"granularity должен быть одним из {ROLLUP_GRANULARITIES}")
+
+    since = _today_start() - timedelta(days=days - 1)
+    conn = await get_conn()
+    try:
+        rows = await get_rollup_stats(conn, granularity, since)
+    finally:
+        await release_conn(conn)
+
+    totals = {field: sum(r[field] or 0 for r in rows if r["status"] == "paid") for field in _TOTAL_FIELDS}
+    return {"ok": True, "granularity": granularity, "since": since, "paid_totals": totals, "rows": rows}
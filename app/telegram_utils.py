@@ -1,19 +1,19 @@
-import httpx
-from .config import TG_BOT_TOKEN, TG_CHAT_ID   # ← относительный импорт
+from .config import TG_BOT_TOKEN, TG_CHAT_ID, TELEGRAM_API_URL   # ← относительный импорт
+from .services import get_client
+from .tracing import traced
 
+@traced("telegram.notify")
 async def notify(text: str):
     if not TG_BOT_TOKEN or not TG_CHAT_ID:
         return
-    url = f"https://api.telegram.org/bot{TG_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TG_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": TG_CHAT_ID,
         "text": text,
         "parse_mode": "HTML",
         "disable_web_page_preview": True,
     }
-    timeout = httpx.Timeout(10.0, read=10.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            await client.post(url, json=payload)
-        except Exception:
-            pass
+    try:
+        await get_client().post(url, json=payload, timeout=10.0)
+    except Exception:
+        pass
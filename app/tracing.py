@@ -0,0 +1,266 @@
+"""Лёгкая трассировка запросов: спаны по стадиям callback'а.
+
+На каждый HTTP-запрос ``TracingMiddleware`` открывает трейс; вызовы
+внешних API, БД и Telegram оборачиваются в спаны (``traced``/``span``).
+Решение о сохранении принимается в конце запроса (tail sampling): в
+кольцевой буфер (``/admin/traces``) и в OTLP-коллектор попадают только
+медленные и упавшие запросы.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import APIRouter, HTTPException, Query
+from structlog.contextvars import bound_contextvars
+
+from .config import (
+    ADMIN_SECRET,
+    TRACE_ENABLED,
+    TRACE_SLOW_MS,
+    TRACE_BUFFER_SIZE,
+    TRACE_OTLP_ENDPOINT,
+    TRACE_EXPORT_INTERVAL,
+)
+from .schemas import TracesOut
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+_current_trace: ContextVar["Trace | None"] = ContextVar("current_trace", default=None)
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+# Последние медленные/упавшие трейсы (новые в конце)
+slow_traces: deque["Trace"] = deque(maxlen=TRACE_BUFFER_SIZE)
+_export_queue: deque["Trace"] = deque(maxlen=TRACE_BUFFER_SIZE * 10)
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes
+        self.error: str | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Trace:
+    __slots__ = ("trace_id", "root", "spans")
+
+    def __init__(self, trace_id: str, name: str, attributes: dict):
+        self.trace_id = trace_id
+        self.root = Span(name, None, attributes)
+        self.spans: list[Span] = [self.root]
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "duration_ms": round(self.root.duration_ms, 3),
+            "attributes": self.root.attributes,
+            "spans": [s.as_dict() for s in self.spans],
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Спан внутри текущего трейса; вне трейса ничего не делает."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get() or trace.root
+    current = Span(name, parent.span_id, attributes)
+    trace.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = repr(exc)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def traced(name: str):
+    """Декоратор для async-функций: весь вызов — один спан ``name``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return await func(*args, **kwargs)
+            with span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _parse_traceparent(headers) -> str | None:
+    for key, value in headers or ():
+        if key == b"traceparent":
+            parts = value.decode("latin-1").split("-")
+            if len(parts) == 4 and len(parts[1]) == 32:
+                return parts[1]
+    return None
+
+
+def _keep(trace: Trace, status_code: int, retry_after: bool = False):
+    """Tail sampling: сохраняем медленные и упавшие запросы.
+
+    503 с Retry-After — намеренный отказ (контроль допуска, draining,
+    повтор операции в процессе), а не сбой: такие трейсы не сохраняются,
+    иначе при перегрузке они вытеснили бы из буфера медленные запросы.
+    """
+    if status_code == 503 and retry_after:
+        return
+    if trace.root.duration_ms < TRACE_SLOW_MS and status_code < 500:
+        return
+    slow_traces.append(trace)
+    if TRACE_OTLP_ENDPOINT:
+        _export_queue.append(trace)
+
+
+class TracingMiddleware:
+    """Открывает трейс на каждый HTTP-запрос."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = _parse_traceparent(scope.get("headers")) or _new_id(16)
+        trace = Trace(
+            trace_id,
+            f"{scope.get('method', '')} {scope.get('path', '')}",
+            {"http.method": scope.get("method", ""), "http.path": scope.get("path", "")},
+        )
+        status_code = 500
+        retry_after = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, retry_after
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                retry_after = any(k.lower() == b"retry-after" for k, _ in message.get("headers") or ())
+            await send(message)
+
+        trace_token = _current_trace.set(trace)
+        try:
+            with bound_contextvars(trace_id=trace_id):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(trace_token)
+            trace.root.end_ns = time.time_ns()
+            trace.root.attributes["http.status_code"] = status_code
+            if status_code >= 500 and not (status_code == 503 and retry_after):
+                trace.root.error = f"HTTP {status_code}"
+            _keep(trace, status_code, retry_after)
+
+
+# =================== Экспорт в OTLP (HTTP/JSON) ===================
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace: Trace, s: Span) -> dict:
+    item = {
+        "traceId": trace.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 2 if s is trace.root else 1,  # SERVER / INTERNAL
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns or s.start_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id:
+        item["parentSpanId"] = s.parent_id
+    return item
+
+
+def to_otlp(traces: list[Trace]) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "playwallet"}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [_otlp_span(t, s) for t in traces for s in t.spans],
+            }],
+        }]
+    }
+
+
+async def export_loop():
+    """Фоновая отправка отобранных трейсов в TRACE_OTLP_ENDPOINT/v1/traces."""
+    import httpx  # экспорт включается только при TRACE_OTLP_ENDPOINT
+
+    url = f"{TRACE_OTLP_ENDPOINT.rstrip('/')}/v1/traces"
+    async with httpx.AsyncClient(timeout=5) as client:
+        while True:
+            await asyncio.sleep(TRACE_EXPORT_INTERVAL)
+            if not _export_queue:
+                continue
+            batch = [_export_queue.popleft() for _ in range(len(_export_queue))]
+            try:
+                r = await client.post(url, json=to_otlp(batch))
+                r.raise_for_status()
+            except Exception as exc:
+                logger.warning("OTLP export of %d trace(s) failed: %s", len(batch), exc)
+
+
+# =================== Админ-эндпоинт ===================
+@router.get("/admin/traces", response_model=TracesOut)
+async def admin_traces(
+    secret: str = Query(...),
+    limit: int = Query(20, ge=1, le=1000),
+    min_ms: float = Query(0, ge=0),
+):
+    if secret != ADMIN_SECRET:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    items = [t.as_dict() for t in reversed(slow_traces) if t.root.duration_ms >= min_ms]
+    return {"ok": True, "slow_ms": TRACE_SLOW_MS, "traces": items[:limit]}
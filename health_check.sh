@@ -4,8 +4,11 @@ echo "=== Проверка PlayWallet v2 ==="
 echo "Статус контейнеров:"
 docker-compose ps
 
-echo -e "\nПроверка API:"
-curl -s http://localhost:8000/health | head -n 5
+echo -e "\nПроверка API (liveness):"
+curl -s http://localhost:8000/health/live | head -n 5
+
+echo -e "\nПроверка API (readiness):"
+curl -s http://localhost:8000/health/ready | head -n 5
 
 echo -e "\nПроверка БД:"
 docker exec playwallet_db_v2 pg_isready -U postgres 2>/dev/null && echo "БД OK" || echo "БД недоступна"
@@ -0,0 +1,121 @@
+"""Микробенчмарк сериализации ответов API: до и после typed-моделей.
+
+«before» — путь FastAPI без response_model: ``jsonable_encoder`` и
+стандартный ``JSONResponse``. «after» — то, что делает FastAPI с
+response_model (валидация и сериализация pydantic-core), плюс
+``FastJSONResponse`` на orjson. Данные — как из asyncpg (Decimal,
+datetime):
+
+    python scripts/bench_serialization.py --number 20000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+
+from app.responses import FastJSONResponse  # noqa: E402
+from app.schemas import OrderOut, BalanceOut, StatsOut  # noqa: E402
+
+NOW = datetime(2025, 3, 1, 12, 30, 15, 123456)
+
+ORDER = {
+    "id": "8d3c1f8e-4b1a-4c1e-9a51-2f0b6f0d9a11",
+    "external_id": "A1B2C3D4E5F6",
+    "login": "steam_login",
+    "service_id": "1",
+    "amount": Decimal("9.87"),
+    "status": "paid",
+    "created_at": NOW,
+    "created_datetime": NOW,
+    "currency": "RUB",
+    "received_amount": Decimal("1000.00"),
+    "received_usd": Decimal("11.2233445566"),
+    "pw_account": "main",
+}
+
+BALANCE = {
+    "ok": True,
+    "status": "success",
+    "data": {"balance": "1234.56", "currency": "USD"},
+    "account": "main",
+    "accounts": [
+        {"name": f"acc{i}", "balance": 1234.56, "latency_ms": 210.5, "error_rate": 0.02}
+        for i in range(3)
+    ],
+}
+
+STATS = {
+    "ok": True,
+    "granularity": "hour",
+    "since": NOW,
+    "paid_totals": {"orders_count": 480, "received_usd": Decimal("5120.55"), "sent_usd": Decimal("4608.50"),
+                    "commission_usd": Decimal("512.05")},
+    "rows": [
+        {
+            "bucket": NOW + timedelta(hours=i),
+            "currency": "RUB",
+            "status": "paid",
+            "orders_count": 10,
+            "received_amount": Decimal("10000.00"),
+            "received_usd": Decimal("106.68"),
+            "sent_usd": Decimal("96.01"),
+            "commission_usd": Decimal("10.67"),
+        }
+        for i in range(48)
+    ],
+}
+
+CASES = [("orders/find", ORDER, OrderOut), ("balance", BALANCE, BalanceOut), ("stats (48 rows)", STATS, StatsOut)]
+
+
+def before(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def make_after(model):
+    field = create_model_field(name="response", type_=model, mode="serialization")
+
+    def after(content) -> bytes:
+        # serialize_response — корутина без await внутри, шагаем её вручную
+        coro = serialize_response(field=field, response_content=content)
+        try:
+            coro.send(None)
+        except StopIteration as stop:
+            return FastJSONResponse(stop.value).body
+        raise RuntimeError("serialize_response suspended")
+
+    return after
+
+
+def bench(func, content, number: int) -> float:
+    func(content)  # прогрев
+    start = time.perf_counter()
+    for _ in range(number):
+        func(content)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'response':<18} {'before µs':>10} {'after µs':>10} {'speedup':>8} {'bytes':>12}")
+    for name, content, model in CASES:
+        after = make_after(model)
+        b, a = bench(before, content, args.number), bench(after, content, args.number)
+        size = f"{len(before(content))}/{len(after(content))}"
+        print(f"{name:<18} {b:>10.1f} {a:>10.1f} {b / a:>7.1f}x {size:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Бенчмарк времени старта (импорта) API и auto_topup с бюджетом.
+
+Каждая цель импортируется в отдельном процессе с ``python -X importtime``
+--runs раз; берётся медиана. Скрипт завершается с кодом 1, если медиана
+превышает бюджет или auto_topup при импорте тянет тяжёлые модули, которые
+должны загружаться лениво (FastAPI/starlette, python-telegram-bot), — его можно
+запускать в CI как проверку:
+
+    python scripts/bench_startup.py --runs 5 --api-budget-ms 1500 --topup-budget-ms 600
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# цель -> (импортируемый модуль, модули, которых не должно быть при импорте)
+TARGETS = {
+    "api": ("app.main", ()),
+    "topup": ("app.auto_topup", ("fastapi", "starlette", "telegram", "websockets")),
+}
+
+
+def measure(module: str, env: dict) -> tuple[float, float, dict[str, int]]:
+    """Один запуск: (время импорта, время процесса целиком, cumulative мкс по модулям)."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    modules: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = int(cumulative)
+        except ValueError:
+            continue  # заголовок
+    return modules.get(module, 0) / 1000, wall, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--api-budget-ms", type=float, default=1500)
+    parser.add_argument("--topup-budget-ms", type=float, default=600)
+    parser.add_argument("--top", type=int, default=8, help="сколько самых тяжёлых пакетов показать")
+    parser.add_argument("targets", nargs="*", help=f"{', '.join(TARGETS)} (по умолчанию — все)")
+    args = parser.parse_args()
+    if unknown := set(args.targets) - set(TARGETS):
+        parser.error(f"неизвестные цели: {', '.join(sorted(unknown))}")
+    args.targets = args.targets or list(TARGETS)
+    budgets = {"api": args.api_budget_ms, "topup": args.topup_budget_ms}
+
+    env = {**os.environ, "LOG_DIR": tempfile.mkdtemp(prefix="bench_startup_")}
+    failed = False
+    for target in args.targets:
+        module, forbidden = TARGETS[target]
+        runs = [measure(module, env) for _ in range(args.runs)]
+        imports = statistics.median(r[0] for r in runs)
+        wall = statistics.median(r[1] for r in runs)
+        modules = runs[len(runs) // 2][2]
+
+        ok = imports <= budgets[target]
+        print(f"{target:<6} import {module}: median {imports:7.1f} ms (process {wall:7.1f} ms), "
+              f"budget {budgets[target]:.0f} ms — {'OK' if ok else 'OVER BUDGET'}")
+        packages = {name: us for name, us in modules.items() if "." not in name and name != module}
+        for name, us in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f"         {us / 1000:7.1f} ms  {name}")
+        loaded = [name for name in forbidden if name in modules]
+        if loaded:
+            print(f"         eagerly imported (must be lazy): {', '.join(loaded)}")
+        failed |= not ok or bool(loaded)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Локальная заглушка Bybit (приватный WebSocket wallet + REST) для auto_topup.
+
+Проверяет подпись auth, отвечает на subscribe/ping и рассылает подписчикам
+изменения баланса USDT. REST отдаёт тот же баланс (wallet-balance) и
+уменьшает его на inter-transfer. Команды в stdin:
+
+    <число>  — установить баланс и разослать сообщение wallet
+    drop     — оборвать все WebSocket-соединения (проверка переподключения)
+
+    python scripts/bybit_ws_stub.py --balance 50
+    BYBIT_WS_ENABLED=true BYBIT_WS_URL=ws://127.0.0.1:8765 \\
+    BYBIT_REST_URL=http://127.0.0.1:8766 python app/auto_topup.py
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import websockets
+
+state = {"balance": 0.0}
+clients: set = set()
+lock = threading.Lock()
+
+
+def wallet_message() -> str:
+    return json.dumps({
+        "topic": "wallet",
+        "creationTime": int(time.time() * 1000),
+        "data": [{
+            "accountType": "UNIFIED",
+            "coin": [{"coin": "USDT", "walletBalance": f"{state['balance']:.2f}"}],
+        }],
+    })
+
+
+def check_auth(args: list, secret: str) -> bool:
+    if len(args) != 3:
+        return False
+    _, expires, sign = args
+    expected = hmac.new(secret.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, str(sign)) and int(expires) > time.time() * 1000
+
+
+async def handler(ws, secret: str):
+    authed = False
+    try:
+        async for raw in ws:
+            msg = json.loads(raw)
+            op = msg.get("op")
+            if op == "auth":
+                authed = check_auth(msg.get("args") or [], secret)
+                await ws.send(json.dumps({"op": "auth", "success": authed, "ret_msg": "" if authed else "bad sign"}))
+            elif op == "subscribe":
+                await ws.send(json.dumps({"op": "subscribe", "success": authed, "ret_msg": ""}))
+                if authed:
+                    clients.add(ws)
+                    print(f"subscribed ({len(clients)} client(s))", flush=True)
+            elif op == "ping":
+                await ws.send(json.dumps({"op": "pong", "success": True, "ret_msg": "pong"}))
+    except websockets.ConnectionClosed:
+        pass
+    finally:
+        clients.discard(ws)
+
+
+async def broadcast():
+    for ws in list(clients):
+        try:
+            await ws.send(wallet_message())
+        except Exception:
+            clients.discard(ws)
+
+
+async def read_commands():
+    loop = asyncio.get_running_loop()
+    while True:
+        line = (await loop.run_in_executor(None, sys.stdin.readline))
+        if not line:
+            return
+        line = line.strip()
+        if line == "drop":
+            for ws in list(clients):
+                await ws.close()
+            print("dropped all connections", flush=True)
+        elif line:
+            with lock:
+                state["balance"] = float(line)
+            await broadcast()
+            print(f"balance={state['balance']:.2f} pushed to {len(clients)} client(s)", flush=True)
+
+
+class RestHandler(BaseHTTPRequestHandler):
+    loop: asyncio.AbstractEventLoop
+
+    def _reply(self, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/v5/account/wallet-balance":
+            self.send_error(404)
+            return
+        print("REST wallet-balance", flush=True)
+        self._reply({"retCode": 0, "result": {"list": [json.loads(wallet_message())["data"][0]]}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if urlparse(self.path).path != "/v5/asset/transfer/inter-transfer":
+            self.send_error(404)
+            return
+        with lock:
+            state["balance"] -= float(body.get("amount", 0))
+        print(f"REST transfer {body.get('amount')} → {body.get('toUserId')}", flush=True)
+        asyncio.run_coroutine_threadsafe(broadcast(), self.loop)
+        self._reply({"retCode": 0, "retMsg": "success", "result": {"transferId": os.urandom(8).hex()}})
+
+    def log_message(self, *args):
+        pass
+
+
+async def main(args):
+    state["balance"] = args.balance
+    RestHandler.loop = asyncio.get_running_loop()
+    rest = ThreadingHTTPServer((args.host, args.rest_port), RestHandler)
+    threading.Thread(target=rest.serve_forever, daemon=True).start()
+    async with websockets.serve(lambda ws, *_: handler(ws, args.secret), args.host, args.port):
+        print(f"Bybit stub: ws://{args.host}:{args.port}  http://{args.host}:{args.rest_port}", flush=True)
+        await read_commands()
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rest-port", type=int, default=8766)
+    parser.add_argument("--balance", type=float, default=0.0)
+    parser.add_argument("--secret", default=os.getenv("BYBIT_API_SECRET", "stub-secret"))
+    args = parser.parse_args()
+    asyncio.run(main(args))
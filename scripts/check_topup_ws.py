@@ -0,0 +1,116 @@
+"""Проверка auto_topup в режиме WebSocket: на один недобор — один перевод.
+
+Поднимает заглушку Bybit (scripts/bybit_ws_stub.py) и PlayWallet
+(scripts/fake_upstreams.py) с балансом ниже MIN_PW_BALANCE, который не
+растёт (перевод «не зачислен»), запускает app/auto_topup.py на --seconds
+секунд и на середине прогона присылает депозит на Bybit — он будит цикл,
+но аккаунт ещё ждёт зачисления. Код выхода 1, если переводов не ровно один:
+
+    python scripts/check_topup_ws.py --seconds 6
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"port {port} did not open")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=6)
+    parser.add_argument("--bybit-balance", type=float, default=1000)
+    parser.add_argument("--pw-balance", type=float, default=10)
+    parser.add_argument("--min-balance", type=float, default=60)
+    parser.add_argument("--amount", type=float, default=120)
+    args = parser.parse_args()
+
+    ws_port, rest_port, pw_port = free_port(), free_port(), free_port()
+    secret = "stub-secret"
+    procs = []
+    try:
+        stub = subprocess.Popen(
+            [sys.executable, "scripts/bybit_ws_stub.py", "--port", str(ws_port), "--rest-port", str(rest_port),
+             "--balance", str(args.bybit_balance), "--secret", secret],
+            cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        procs.append(stub)
+        procs.append(subprocess.Popen(
+            [sys.executable, "scripts/fake_upstreams.py", "--port", str(pw_port), "--pw-balance", str(args.pw_balance),
+             "--report-every", "3600"],
+            cwd=ROOT, stdout=subprocess.DEVNULL,
+        ))
+        for port in (ws_port, rest_port, pw_port):
+            wait_port(port)
+
+        stub_lines: list[str] = []
+        threading.Thread(target=lambda: stub_lines.extend(iter(stub.stdout.readline, "")), daemon=True).start()
+
+        env = {
+            **os.environ,
+            "BYBIT_WS_ENABLED": "true",
+            "BYBIT_WS_URL": f"ws://127.0.0.1:{ws_port}",
+            "BYBIT_REST_URL": f"http://127.0.0.1:{rest_port}",
+            "BYBIT_API_KEY": "stub-key",
+            "BYBIT_API_SECRET": secret,
+            "BYBIT_UID": "1",
+            "PW_ACCOUNTS": "",
+            "PW_USE_PROD": "false",
+            "PW_DEV_URL": f"http://127.0.0.1:{pw_port}",
+            "PW_DEV_TOKEN": "stub-token",
+            "MIN_PW_BALANCE": str(args.min_balance),
+            "TOPUP_AMOUNT": str(args.amount),
+            "TOPUP_CHECK_INTERVAL": "600",
+            "TOPUP_DRY_RUN": "false",
+            "TG_BOT_TOKEN": "",
+            "TG_CHAT_ID": "",
+            "LOG_DIR": tempfile.mkdtemp(prefix="check_topup_"),
+        }
+        topup = subprocess.Popen(
+            [sys.executable, "app/auto_topup.py"], cwd=ROOT, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        procs.append(topup)
+
+        time.sleep(args.seconds / 2)
+        # депозит на Bybit будит цикл, но перевод ещё не зачислен в PlayWallet
+        stub.stdin.write(f"{args.bybit_balance * 2}\n")
+        stub.stdin.flush()
+        time.sleep(args.seconds / 2)
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    transfers = [line.strip() for line in stub_lines if line.startswith("REST transfer")]
+    for line in transfers:
+        print(line)
+    if len(transfers) != 1:
+        print(f"FAIL: expected exactly 1 transfer, got {len(transfers)}")
+        sys.exit(1)
+    print("OK: exactly 1 transfer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Фейковые внешние API для staging/replay: Digiseller, PlayWallet, FX, Telegram.
+
+Все сервисы на одном порту; задержка ответа задаётся --latency-ms/--jitter-ms.
+Staging-инстанс направляется сюда переменными окружения:
+
+    python scripts/fake_upstreams.py --port 9100 --latency-ms 150 --jitter-ms 100
+    DIGISELLER_API_URL=http://127.0.0.1:9100 FX_API_URL=http://127.0.0.1:9100 \\
+    TELEGRAM_API_URL=http://127.0.0.1:9100 PW_USE_PROD=false PW_DEV_URL=http://127.0.0.1:9100 \\
+    uvicorn app.main:app
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_counts: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+class FakeUpstreams(BaseHTTPRequestHandler):
+    latency = 0.0
+    jitter = 0.0
+    amount = 500.0
+    currency = "RUB"
+    usd_rate = 0.011
+    pw_balance = 100000.0
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> dict:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        return json.loads(raw or b"{}")
+
+    def _route(self, name: str):
+        with _lock:
+            _counts[name] = _counts.get(name, 0) + 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        if m := re.fullmatch(r"/api/purchases/unique-code/(.+)", path):
+            self._route("digiseller.unique_code")
+            self._reply({
+                "retval": 0,
+                "unique_code_state": {"state": 2},
+                "amount": self.amount,
+                "type_curr": self.currency,
+                "options": [{"value": f"login_{m.group(1)[:12]}"}],
+            })
+        elif path == "/latest":
+            self._route("fx")
+            self._reply({"rates": {"USD": self.usd_rate}, "base": parse_qs(url.query).get("from", ["RUB"])[0]})
+        elif path == "/get-balance":
+            self._route("playwallet.get_balance")
+            self._reply({"status": "success", "data": {"balance": f"{self.pw_balance:.2f}", "currency": "USD"}})
+        elif m := re.fullmatch(r"/get-order/(.+)", path):
+            self._route("playwallet.get_order")
+            self._reply({"status": "success", "data": {"id": m.group(1), "status": "paid"}})
+        else:
+            self._reply({"error": "not found"}, 404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        body = self._body()
+        if path == "/api/apilogin":
+            self._route("digiseller.login")
+            self._reply({"retval": 0, "token": "fake-digiseller-token"})
+        elif path == "/create-order":
+            self._route("playwallet.create_order")
+            self._reply({"status": "success", "data": {
+                "id": str(uuid.uuid4()),
+                "externalId": body.get("externalId"),
+                "serviceId": body.get("serviceId"),
+                "amount": body.get("amount"),
+                "login": body.get("login"),
+                "status": "created",
+                "createdDateTime": datetime.utcnow().isoformat(),
+            }})
+        elif path == "/pay-order":
+            self._route("playwallet.pay_order")
+            self._reply({"status": "success", "data": {"id": body.get("id"), "status": "paid"}})
+        elif re.fullmatch(r"/bot[^/]+/sendMessage", path):
+            self._route("telegram")
+            self._reply({"ok": True, "result": {}})
+        else:
+            self._reply({"error": "not found"}, 404)
+
+    def log_message(self, *args):
+        pass
+
+
+def _report_loop(interval: float):
+    while True:
+        time.sleep(interval)
+        with _lock:
+            if _counts:
+                print(" ".join(f"{k}={v}" for k, v in sorted(_counts.items())), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--amount", type=float, default=500.0, help="сумма покупки Digiseller")
+    parser.add_argument("--currency", default="RUB")
+    parser.add_argument("--pw-balance", type=float, default=100000.0, help="баланс PlayWallet (get-balance)")
+    parser.add_argument("--report-every", type=float, default=10, help="печать счётчиков вызовов (сек)")
+    args = parser.parse_args()
+
+    FakeUpstreams.latency = args.latency_ms / 1000
+    FakeUpstreams.jitter = args.jitter_ms / 1000
+    FakeUpstreams.amount = args.amount
+    FakeUpstreams.currency = args.currency
+    FakeUpstreams.pw_balance = args.pw_balance
+    threading.Thread(target=_report_loop, args=(args.report_every,), daemon=True).start()
+    print(f"Fake upstreams listening on http://{args.host}:{args.port}", flush=True)
+    ThreadingHTTPServer((args.host, args.port), FakeUpstreams).serve_forever()
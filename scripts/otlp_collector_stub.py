@@ -0,0 +1,41 @@
+"""Локальная заглушка OTLP/HTTP-коллектора для проверки экспорта трейсов.
+
+Принимает POST /v1/traces (JSON) и печатает по строке на спан:
+
+    python scripts/otlp_collector_stub.py --port 4318
+    TRACE_OTLP_ENDPOINT=http://localhost:4318 uvicorn app.main:app
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class OTLPHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path != "/v1/traces":
+            self.send_response(404)
+            self.end_headers()
+            return
+        payload = json.loads(body or b"{}")
+        for resource in payload.get("resourceSpans", []):
+            for scope in resource.get("scopeSpans", []):
+                for s in scope.get("spans", []):
+                    ms = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+                    print(f"{s['traceId'][:8]} {s.get('parentSpanId', '-'):>16} {s['name']:<32} {ms:9.1f} ms", flush=True)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    args = parser.parse_args()
+    print(f"OTLP stub listening on http://{args.host}:{args.port}/v1/traces", flush=True)
+    HTTPServer((args.host, args.port), OTLPHandler).serve_forever()
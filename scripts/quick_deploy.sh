@@ -27,12 +27,15 @@ docker compose build --no-cache
 echo "Запуск сервисов..."
 docker compose up -d
 
-# Ждем запуска
+# Ждем прогрева (readiness становится true после warm-up)
 echo "Ожидание готовности сервисов..."
-sleep 30
+for _ in $(seq 1 60); do
+    curl -sf http://localhost:8000/health/ready > /dev/null 2>&1 && break
+    sleep 2
+done
 
 # Проверяем статус
-if curl -f http://localhost:8000/health > /dev/null 2>&1; then
+if curl -f http://localhost:8000/health/ready > /dev/null 2>&1; then
     echo "✅ Сервис запущен успешно!"
     echo "🌐 API: http://localhost:8000"
     echo "📊 Grafana: http://localhost:3000"
@@ -0,0 +1,159 @@
+"""Воспроизведение записанных запросов (CAPTURE_FILE) на staging-инстансе.
+
+Запросы отправляются с исходными интервалами, ускоренными в --speed раз,
+или без пауз (--speed max, параллельно не больше --concurrency). Коды
+покупок дополняются суффиксом прогона, чтобы идемпотентность не
+превратила повтор в «Уже обработан»; ``***`` в secret заменяется на
+--admin-secret. В конце — пропускная способность, статусы и перцентили
+задержки (в сравнении с записанными):
+
+    python scripts/replay_capture.py logs/capture.ndjson --target http://staging:8000 --speed 10
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import httpx
+
+_CODE_KEYS = {"unique_code", "uniquecode"}
+
+
+def load(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["ts"])
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = max(0, math.ceil(p / 100 * len(values)) - 1)
+    return values[k]
+
+
+def prepare(record: dict, run_id: str | None, admin_secret: str | None) -> dict:
+    params = []
+    for key, value in record.get("query") or []:
+        if key in _CODE_KEYS and run_id:
+            value = f"{value}-{run_id}"
+        elif key == "secret" and value == "***" and admin_secret is not None:
+            value = admin_secret
+        params.append((key, value))
+    return {"method": record["method"], "url": record["path"], "params": params, "json": record.get("body")}
+
+
+async def replay(records: list[dict], args) -> list[dict]:
+    run_id = None if args.keep_codes else uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results: list[dict] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+
+        async def send(record: dict, scheduled: float):
+            request = prepare(record, run_id, args.admin_secret)
+            # опоздание старта относительно расписания (event loop клиента не успевает)
+            lag_ms = (time.perf_counter() - scheduled) * 1000
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    r = await client.request(**request)
+                    status = r.status_code
+                except httpx.HTTPError as exc:
+                    status = type(exc).__name__
+                results.append({
+                    "path": record["path"],
+                    "status": status,
+                    "latency_ms": (time.perf_counter() - start) * 1000,
+                    "lag_ms": lag_ms,
+                    "captured_ms": record.get("duration_ms"),
+                })
+
+        tasks = []
+        t0 = records[0]["ts"]
+        start = time.perf_counter()
+        for record in records:
+            scheduled = start
+            if args.speed:
+                scheduled = start + (record["ts"] - t0) / args.speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(record, scheduled)))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def report(results: list[dict], wall: float, args) -> dict:
+    def summary(items: list[dict]) -> dict:
+        lat = [r["latency_ms"] for r in items]
+        captured = [r["captured_ms"] for r in items if r["captured_ms"] is not None]
+        return {
+            "requests": len(items),
+            "status": dict(Counter(str(r["status"]) for r in items)),
+            "latency_ms": {f"p{p}": round(percentile(lat, p), 1) for p in (50, 90, 95, 99, 100)},
+            "captured_latency_ms": {f"p{p}": round(percentile(captured, p), 1) for p in (50, 90, 99)},
+        }
+
+    by_path = defaultdict(list)
+    for r in results:
+        by_path[r["path"]].append(r)
+    return {
+        "target": args.target,
+        "speed": args.speed or "max",
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else None,
+        "max_start_lag_ms": round(max((r["lag_ms"] for r in results), default=0), 1),
+        "total": summary(results),
+        "paths": {path: summary(items) for path, items in sorted(by_path.items())},
+    }
+
+
+def _print(rep: dict):
+    print(f"target={rep['target']} speed={rep['speed']} wall={rep['wall_s']}s "
+          f"throughput={rep['throughput_rps']} req/s max_start_lag={rep['max_start_lag_ms']} ms")
+    rows = [("TOTAL", rep["total"]), *rep["paths"].items()]
+    print(f"{'path':<24} {'n':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}  status (captured p50/p99)")
+    for name, s in rows:
+        lat, cap = s["latency_ms"], s["captured_latency_ms"]
+        statuses = " ".join(f"{k}:{v}" for k, v in sorted(s["status"].items()))
+        print(f"{name:<24} {s['requests']:>6} {lat['p50']:>8} {lat['p90']:>8} {lat['p95']:>8} {lat['p99']:>8} "
+              f"{lat['p100']:>8}  {statuses} ({cap['p50']}/{cap['p99']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="NDJSON из CAPTURE_FILE")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", default="1", help="1 — как записано, 10 — в 10 раз быстрее, max — без пауз")
+    parser.add_argument("--concurrency", type=int, default=64, help="максимум одновременных запросов")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--admin-secret", default=None, help="подставить вместо *** в secret")
+    parser.add_argument("--keep-codes", action="store_true", help="не добавлять суффикс прогона к кодам")
+    parser.add_argument("--limit", type=int, default=0, help="взять только первые N запросов")
+    parser.add_argument("--json", action="store_true", help="отчёт в JSON")
+    args = parser.parse_args()
+    args.speed = 0.0 if args.speed == "max" else float(args.speed)
+
+    records = load(args.file)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        parser.error("в файле нет запросов")
+
+    start = time.perf_counter()
+    results = asyncio.run(replay(records, args))
+    rep = report(results, time.perf_counter() - start, args)
+    if args.json:
+        print(json.dumps(rep, ensure_ascii=False, indent=2))
+    else:
+        _print(rep)
+
+
+if __name__ == "__main__":
+    main()
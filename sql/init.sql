@@ -9,8 +9,36 @@ CREATE TABLE IF NOT EXISTS orders (
     created_datetime TIMESTAMP     -- точное время из PlayWallet (ISO → TIMESTAMP)
 );
 
+-- Данные об оплате покупателя (для статистики оборота и комиссии)
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS currency TEXT;              -- валюта оплаты (USD/RUB/...)
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS received_amount NUMERIC;    -- сумма, полученная от покупателя
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS received_usd NUMERIC;       -- та же сумма в USD до комиссии
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS pw_account TEXT;            -- аккаунт PlayWallet, через который прошёл заказ
+
 -- Индексы для быстрых выборок
 CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at);
 CREATE INDEX IF NOT EXISTS idx_orders_created_dt ON orders (created_datetime);
 CREATE INDEX IF NOT EXISTS idx_orders_external_id ON orders (external_id);
 CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status);
+
+-- Незавершённые операции с заказами, сохранённые при остановке инстанса
+CREATE TABLE IF NOT EXISTS pending_operations (
+    key TEXT PRIMARY KEY,          -- external_id операции (код Plati / manual_admin_...)
+    kind TEXT NOT NULL,            -- plati_callback / admin_topup
+    stage TEXT NOT NULL,           -- received/creating/created/paying/review
+    context JSONB NOT NULL,        -- данные для продолжения (логин, заказ PlayWallet, суммы)
+    saved_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Почасовые агрегаты по заказам (обновляются при вставке/оплате и фоновым пересчётом)
+CREATE TABLE IF NOT EXISTS orders_rollup_hourly (
+    bucket TIMESTAMP NOT NULL,                 -- date_trunc('hour', orders.created_at)
+    currency TEXT NOT NULL,
+    status TEXT NOT NULL,
+    orders_count BIGINT NOT NULL DEFAULT 0,
+    received_amount NUMERIC NOT NULL DEFAULT 0, -- в валюте оплаты
+    received_usd NUMERIC NOT NULL DEFAULT 0,
+    sent_usd NUMERIC NOT NULL DEFAULT 0,        -- отправлено в PlayWallet
+    commission_usd NUMERIC NOT NULL DEFAULT 0,  -- received_usd - sent_usd
+    PRIMARY KEY (bucket, currency, status)
+);